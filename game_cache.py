@@ -0,0 +1,246 @@
+# game_cache.py
+# Ronald L. Rivest and Emily Shen
+#
+# Persistent (on-disk) cache of solutions to two-person zero-sum games,
+# keyed by a canonical form of the payoff (margin) matrix.
+
+"""
+** Author:  Ronald L. Rivest and Emily Shen
+** Email:   rivest@mit.edu, eshen@csail.mit.edu
+**
+** (The following license is known as "The MIT License")
+**
+** Copyright (c) 2010 Ronald L. Rivest and Emily Shen
+**
+** Permission is hereby granted, free of charge, to any person obtaining a copy
+** of this software and associated documentation files (the "Software"), to deal
+** in the Software without restriction, including without limitation the rights
+** to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+** copies of the Software, and to permit persons to whom the Software is
+** furnished to do so, subject to the following conditions:
+**
+** The above copyright notice and this permission notice shall be included in
+** all copies or substantial portions of the Software.
+**
+** THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+** IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+** FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+** AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+** LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+** OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+** THE SOFTWARE.
+**
+** (end of license)
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+####################################################################################
+### Canonical form of a payoff matrix
+####################################################################################
+
+"""
+The optimal (and the balanced optimal) mixed strategies of a game are unchanged
+when the payoff matrix is multiplied by a positive constant, and are permuted
+along with the candidates when the candidates are relabeled.  So the cache is
+keyed by a canonical form of the matrix:
+   -- an integer matrix is divided by the gcd of its entries;
+      any other matrix is divided by its largest absolute entry;
+   -- the candidates are ordered by permutation-invariant row signatures,
+      and then, among candidates with equal signatures, by the permutation
+      giving the lexicographically smallest matrix.
+The last step tries (product of factorials of the sizes of the groups of
+candidates with equal signatures) permutations; when that exceeds
+max_canonical_permutations, the candidates in each group are just left in
+their given order.  The key is then still correct, but relabeled copies of
+such a matrix may miss in the cache.
+"""
+
+max_canonical_permutations = 720
+
+def gcd(a,b):
+    while b:
+        a,b = b, a % b
+    return a
+
+def normalized_matrix(payoff):
+    """
+    Return payoff matrix (list of rows) divided by the gcd of its entries if they are
+    all integers, or else by its largest absolute entry.
+    """
+    entries = [ x for row in payoff for x in row ]
+    if all([ x == int(x) for x in entries ]):
+        g = 0
+        for x in entries:
+            g = gcd(g,abs(int(x)))
+        if g == 0:
+            g = 1
+        return [ [ int(x) // g for x in row ] for row in payoff ]
+    scale = max([ abs(x) for x in entries ])
+    return [ [ float(x) / scale for x in row ] for row in payoff ]
+
+def canonical_form(payoff):
+    """
+    Return (key,perm) for payoff matrix (list of rows), where key is a string giving
+    the canonical form of the matrix, and perm is a list such that row/column i
+    of the canonical form is row/column perm[i] of payoff.
+    """
+    M = normalized_matrix(payoff)
+    m = len(M)
+    signature = [ (sum(M[i]), sorted(M[i]), sorted([ M[j][i] for j in range(m) ])) for i in range(m) ]
+    order = sorted(range(m), key=lambda i: signature[i])
+    groups = [ ]                               # runs of candidates with equal signatures
+    for i in order:
+        if groups and signature[groups[-1][0]] == signature[i]:
+            groups[-1].append(i)
+        else:
+            groups.append([ i ])
+    count = 1
+    for group in groups:
+        for k in range(2,len(group)+1):
+            count *= k
+    if count > max_canonical_permutations:
+        perm_choices = [ order ]
+    else:
+        perm_choices = [ list(itertools.chain(*choice)) for choice in
+                         itertools.product(*[ itertools.permutations(group) for group in groups ]) ]
+    best = None
+    for perm in perm_choices:
+        candidate = [ [ M[i][j] for j in perm ] for i in perm ]
+        if best == None or candidate < best[0]:
+            best = (candidate,perm)
+    (canonical,perm) = best
+    key = repr(canonical)
+    return (key,perm)
+
+####################################################################################
+### The cache
+####################################################################################
+
+class GameCache(object):
+    """
+    Persistent cache of game solutions, kept in an SQLite database file.
+    Solutions are stored for the canonical form of the payoff matrix, together with
+    the kind of solution (e.g. "qp" for the balanced optimal mixed strategy, "lp" for
+    some optimal mixed strategy), and mapped back to the caller's candidate order.
+
+    The cache holds at most max_entries solutions (checked every evict_interval
+    insertions); the least recently used solutions are evicted first.  A lookup
+    records the time of use only if the recorded one is more than touch_interval
+    seconds old, so that most lookups are pure reads and don't take the database's
+    write lock.
+
+    Several threads and worker processes may share one cache file: each thread of each
+    process uses its own database connection, and SQLite's locking keeps the file
+    consistent.  The cache is only advisory, so a lookup or insertion that fails
+    (e.g. because the database stays locked for more than timeout seconds) just
+    counts as a miss or is dropped.
+    """
+
+    def __init__(self,filename,max_entries=100000,evict_interval=100,timeout=30.0,
+                 touch_interval=60.0):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.touch_interval = touch_interval
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.inserts_since_evict = 0
+        self.stats = { "hits": 0, "misses": 0, "inserts": 0, "errors": 0 }
+        conn = self.connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                         " kind TEXT, key TEXT, solution TEXT, last_used REAL,"
+                         " PRIMARY KEY (kind,key))")
+            conn.execute("CREATE INDEX IF NOT EXISTS solutions_last_used"
+                         " ON solutions (last_used)")
+
+    def connection(self):
+        """
+        Return the database connection for this thread (and process).
+        """
+        pid = os.getpid()
+        if getattr(self.local,"pid",None) != pid:
+            self.local.conn = sqlite3.connect(self.filename,timeout=self.timeout)
+            self.local.conn.execute("PRAGMA journal_mode=WAL")
+            self.local.pid = pid
+        return self.local.conn
+
+    def count(self,name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get(self,kind,payoff):
+        """
+        Return the cached solution of the given kind for payoff matrix payoff
+        (a list of probabilities, in the order of payoff's rows), or None.
+        """
+        (key,perm) = canonical_form(payoff)
+        try:
+            conn = self.connection()
+            row = conn.execute("SELECT solution, last_used FROM solutions WHERE kind=? AND key=?",
+                               (kind,key)).fetchone()
+            now = time.time()
+            if row != None and now - row[1] > self.touch_interval:
+                with conn:
+                    conn.execute("UPDATE solutions SET last_used=? WHERE kind=? AND key=?",
+                                 (now,kind,key))
+        except sqlite3.Error:
+            self.count("errors")
+            row = None
+        if row == None:
+            self.count("misses")
+            return None
+        self.count("hits")
+        canonical_x = json.loads(row[0])
+        x = [ 0.0 ] * len(perm)
+        for (i,pi) in enumerate(perm):
+            x[pi] = canonical_x[i]
+        return x
+
+    def put(self,kind,payoff,x):
+        """
+        Store solution x (in the order of payoff's rows) of the given kind for payoff matrix payoff.
+        """
+        (key,perm) = canonical_form(payoff)
+        canonical_x = [ x[pi] for pi in perm ]
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO solutions VALUES (?,?,?,?)",
+                             (kind,key,json.dumps(canonical_x),time.time()))
+        except sqlite3.Error:
+            self.count("errors")
+            return
+        self.count("inserts")
+        with self.lock:
+            self.inserts_since_evict += 1
+            evict_wanted = (self.inserts_since_evict >= self.evict_interval)
+            if evict_wanted:
+                self.inserts_since_evict = 0
+        if evict_wanted:
+            self.evict()
+
+    def evict(self):
+        """
+        Evict least recently used solutions until at most max_entries remain.
+        """
+        try:
+            conn = self.connection()
+            with conn:
+                n = conn.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+                if n > self.max_entries:
+                    conn.execute("DELETE FROM solutions WHERE rowid IN"
+                                 " (SELECT rowid FROM solutions ORDER BY last_used LIMIT ?)",
+                                 (n-self.max_entries,))
+        except sqlite3.Error:
+            self.count("errors")
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
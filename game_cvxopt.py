@@ -37,7 +37,21 @@
 ** (end of license)
 """
 
-from cvxopt import matrix, solvers
+from fractions import Fraction
+import itertools
+import math
+import multiprocessing
+import string
+import threading
+import time
+
+from cvxopt import blas, div, exp, lapack, matrix, mul, solvers, spdiag, spmatrix
+
+try:
+    import numpy
+    import scipy.optimize
+except ImportError:                      # SciPy is optional (see ScipyBackend)
+    scipy = None
 
 def identity(n):
     """
@@ -47,6 +61,202 @@ def identity(n):
     I[::n+1] = 1.0
     return I
 
+####################################################################################
+### Solver options and concurrency
+####################################################################################
+
+"""
+The CVXOPT solvers are given their options (tolerances, progress printing) with
+each call, as options=..., rather than through the process-global dict
+cvxopt.solvers.options, which this module never changes.  The options used are
+copies of lp_options or qp_options (see solver_options), with any per-call
+changes (e.g. the loose tolerances of polished_qp_solver).
+
+Concurrency model: every solve builds its own matrices and options, so any
+number of threads may call the solvers (and solve_game, and the backends)
+concurrently on different games.  The module settings (lp_options, qp_options,
+solver_backend and the other tunables below) are only read during a solve;
+change them before starting a pool of threads, not while it runs.  Counters
+such as polish_stats are updated under stats_lock.  A GameSolver keeps warm-start
+state, so each thread needs its own (as vs.py's gt_game_solver arranges).
+CVXOPT's BLAS and LAPACK calls release the GIL, but the interior-point iterations
+are Python code, so threads mostly overlap small solves with other work; for
+CPU-bound batches of solves, a pool of processes scales better.
+"""
+
+lp_options = { 'feastol': 1e-9, 'show_progress': False }
+qp_options = { 'feastol': 1e-6,          # slightly relaxed from default (avoids singular KKT messages)
+               'abstol': 1e-9,           # gives us good accuracy on final result
+               'show_progress': False }
+stats_lock = threading.Lock()
+
+def solver_options(options,**changes):
+    """
+    Return a copy of the options dict options, with the given changes, for one solver call.
+    """
+    options = dict(options)
+    options.update(changes)
+    return options
+
+####################################################################################
+### Conditioning of payoff matrices
+####################################################################################
+
+"""
+The optimal mixed strategies of a game do not change when its payoffs are
+multiplied by a positive constant, but the interior-point solvers do: lp_solver
+and qp_solver shift the payoffs by v = max(1, -2 * min(payoff)), so raw vote
+margins in the hundreds of thousands give a badly scaled G and a tiny
+right-hand side b = 1/v, and the absolute tolerances mean different things for
+different elections.  So with payoff_normalization = "max", the CVXOPT solvers
+(lp_solver, qp_solver, structured_qp_solver and GameSolver) first divide the
+payoffs by their largest absolute value (see conditioned_payoff).  Then v = 2,
+every entry of the shifted matrix lies in [1,3], and the tolerances are
+relative to the largest margin.  The strategies need no un-normalizing, and the
+game value (zero for symmetric games) only scales.  With None, the payoffs are
+used as given.
+"""
+
+payoff_normalization = "max"            # "max" or None
+
+def conditioned_payoff(payoff):
+    """
+    Return payoff matrix (list of rows) divided by its largest absolute entry, if
+    payoff_normalization is "max" (and the matrix is not zero); else payoff itself.
+    """
+    if payoff_normalization != "max":
+        return payoff
+    scale = float(max([ abs(pij) for row in payoff for pij in row ] + [ 0 ]))
+    if scale == 0.0:
+        return payoff
+    return [ [ pij / scale for pij in row ] for row in payoff ]
+
+####################################################################################
+### Solver instrumentation
+####################################################################################
+
+"""
+Every CVXOPT solve made by this module is recorded in solve_log, as a dict with
+    "solver"         -- the function making the call (e.g. "qp_solver")
+    "kind"           -- "lp" or "qp"
+    "m"              -- number of strategies
+    "status"         -- CVXOPT's status ('optimal' or 'unknown'), or "error: ..."
+                        if the solver raised an exception (e.g. a singular KKT matrix)
+    "iterations", "primal infeasibility", "dual infeasibility", "gap",
+    "relative gap"   -- as reported by CVXOPT (None after an error)
+    "feastol", "abstol" -- the tolerances used
+    "seconds"        -- wall time of the call
+    "payoff"         -- the payoff matrix, kept only for solves that did not end
+                        with status 'optimal', to help find pathological games.
+SolveLog.summary_lines gives histograms of these over a run (see vs.py's
+compare_methods).  A log keeps at most max_records records, but its counts
+cover all solves.  solve_log is shared by all threads (see stats_lock); worker
+processes each have their own.
+"""
+
+class SolveLog(object):
+    """
+    Log of CVXOPT solves (see above).
+    """
+
+    def __init__(self,max_records=100000):
+        self.max_records = max_records
+        self.clear()
+
+    def clear(self):
+        with stats_lock:
+            self.records = [ ]
+            self.count = 0
+
+    def add(self,record):
+        with stats_lock:
+            self.count += 1
+            if len(self.records) < self.max_records:
+                self.records.append(record)
+
+    def summary_lines(self,worst=3):
+        """
+        Return a list of lines summarizing the logged solves: counts by solver and status,
+        and histograms of iterations, wall time, residuals and gaps.
+        """
+        records = self.records[:]
+        lines = [ "CVXOPT solves: %d (%d recorded)"%(self.count,len(records)) ]
+        if records == [ ]:
+            return lines
+        for (name,key) in [ ("solver",lambda r: "%s %s"%(r["solver"],r["kind"])),
+                            ("status",lambda r: r["status"]),
+                            ("iterations",lambda r: r["iterations"]) ]:
+            lines.append("  %s: "%name + histogram_text(histogram([ key(r) for r in records ])))
+        for name in [ "seconds", "primal infeasibility", "dual infeasibility", "gap" ]:
+            values = [ r[name] for r in records if r[name] != None ]
+            lines.append("  %s: "%name + histogram_text(decade_histogram(values)))
+        slow = sorted([ r for r in records if r["iterations"] != None ],
+                      key=lambda r: -r["iterations"])[:worst]
+        for r in slow:
+            lines.append("  slowest: %s %s, m = %d, %d iterations, %.4f seconds, status %s"% \
+                         (r["solver"],r["kind"],r["m"],r["iterations"],r["seconds"],r["status"]))
+        failed = [ r for r in records if r["status"] != 'optimal' ]
+        if failed != [ ]:
+            lines.append("  %d solves did not reach status 'optimal' (payoffs kept in their records)"% \
+                         len(failed))
+        return lines
+
+solve_log = SolveLog()
+
+def histogram(values):
+    """
+    Return sorted list of (value,count) pairs for the given list of values.
+    """
+    counts = { }
+    for value in values:
+        counts[value] = counts.get(value,0) + 1
+    return sorted(counts.items())
+
+def decade_histogram(values):
+    """
+    Return sorted list of (bin,count) pairs, where bin is a string "1e-5" standing for
+    the values v with 1e-5 <= abs(v) < 1e-4 (or "0" for zero).
+    """
+    bins = [ ]
+    for v in values:
+        if v == 0:
+            bins.append((None,"0"))
+        else:
+            exponent = int(math.floor(math.log10(abs(v))))
+            bins.append((exponent,"1e%d"%exponent))
+    return [ (label,count) for ((exponent,label),count) in histogram(bins) ]
+
+def histogram_text(pairs):
+    return string.join([ "%s:%d"%(value,count) for (value,count) in pairs ],"  ")
+
+def logged_solve(solver,kind,payoff,options,call):
+    """
+    Return the solution dict from call() (a CVXOPT solve of the given kind for the
+    given payoff matrix, by the named solver function, with the given options),
+    recording it in solve_log.
+    """
+    start = time.time()
+    record = { "solver": solver, "kind": kind, "m": len(payoff),
+               "feastol": options.get('feastol'), "abstol": options.get('abstol'),
+               "iterations": None, "primal infeasibility": None,
+               "dual infeasibility": None, "gap": None, "relative gap": None }
+    try:
+        sol = call()
+    except (ValueError, ArithmeticError), e:
+        record["seconds"] = time.time() - start
+        record["status"] = "error: %s"%e
+        record["payoff"] = payoff
+        solve_log.add(record)
+        raise
+    record["seconds"] = time.time() - start
+    record["status"] = sol['status']
+    for name in [ "iterations", "primal infeasibility", "dual infeasibility", "gap", "relative gap" ]:
+        record[name] = sol.get(name)
+    if sol['status'] != 'optimal':
+        record["payoff"] = payoff
+    solve_log.add(record)
+    return sol
+
 ####################################################################################
 ### LP solver (finds *some* optimal mixed strategy)
 ####################################################################################
@@ -59,8 +269,8 @@ def lp_solver(payoff):
     """
     m = len(payoff)
 
-    # convert payoff matrix to cvxopt matrix object M and negate
-    M = matrix(payoff).trans()
+    # convert (conditioned) payoff matrix to cvxopt matrix object M and negate
+    M = matrix(conditioned_payoff(payoff)).trans()
     M = -M
 
     # make M all positive by adding large constant v
@@ -75,9 +285,9 @@ def lp_solver(payoff):
     c = matrix(1.0, (m, 1))
 
     # solve LP problem
-    solvers.options['feastol']=1e-9
-    solvers.options['show_progress']=False
-    x = solvers.lp(c, G, h)['x'];
+    options = solver_options(lp_options)
+    x = logged_solve("lp_solver", "lp", payoff, options,
+                     lambda: solvers.lp(c, G, h, options=options))['x'];
 
     # if any were even slightly negative, round up to zero.
     for i in range(m):
@@ -95,18 +305,21 @@ def lp_solver(payoff):
 ### QP solver (finds *balanced* optimal mixed strategy)
 ####################################################################################
 
-def qp_solver(payoff):
+def qp_solver(payoff,feastol=None,abstol=None,multiplicity=None):
     """
     Solve zero-sum two-person symmetric game M of payoffs.
     Input matrix M is m x m.
     Return value x that is an optimal mixed strategy that minimizes
     sum of squares of x_i. (I.e, it is ``balanced.'')
-    Uses function qp from cvxopt library
+    Uses function qp from cvxopt library, with the given tolerances
+    (default: those in qp_options).
+    If multiplicity (a list of positive ints) is given, x minimizes
+    sum of x_i**2 / multiplicity[i] instead (see exact_active_set_balancing).
     """
     m = len(payoff)
 
-    # convert payoff matrix to cvxopt matrix object M and negate
-    M = matrix(payoff).trans()
+    # convert (conditioned) payoff matrix to cvxopt matrix object M and negate
+    M = matrix(conditioned_payoff(payoff)).trans()
     M = -M
 
     # make M all positive by adding large constant v
@@ -115,7 +328,10 @@ def qp_solver(payoff):
 
     # set up P, q so that minimizing sum of squares of p_i is
     # equivalent to minimizing 1/2 x^T P x + q^T x
-    P = identity(m)                          # P is m x m
+    if multiplicity == None:
+        P = identity(m)                      # P is m x m
+    else:
+        P = spdiag([ 1.0 / k for k in multiplicity ])
     q = matrix([0.0]*m)                      # q is m x 1
 
     # set up G, h so that M x >= 1 and x >= 0 are equivalent to G x <= h
@@ -136,10 +352,13 @@ def qp_solver(payoff):
     # These properties should anyway be met by this code.
     
     # solve constrained least squares problem
-    solvers.options['feastol']=1e-6      # slightly relaxed from default (avoids singular KKT messages)
-    solvers.options['abstol']= 1e-9      # gives us good accuracy on final result
-    solvers.options['show_progress']=False
-    x = solvers.qp(P, q, G, h, A, b)['x'];
+    options = solver_options(qp_options)
+    if feastol != None:
+        options['feastol'] = feastol
+    if abstol != None:
+        options['abstol'] = abstol
+    x = logged_solve("qp_solver", "qp", payoff, options,
+                     lambda: solvers.qp(P, q, G, h, A, b, options=options))['x'];
 
     # if any were even slightly negative, round up to zero
     for i in range(m):
@@ -153,6 +372,1813 @@ def qp_solver(payoff):
 
     return x
 
+####################################################################################
+### Active-set polishing (exact supports from cheap solves)
+####################################################################################
+
+"""
+Tight interior-point tolerances cost many extra iterations, and still leave tiny
+positive probabilities where the balanced strategy has zeros.  Polishing
+instead takes a solution x found at loose tolerances, guesses the active set
+from it, and solves the optimality conditions on that active set directly.  For
+a symmetric game (antisymmetric M) the balanced strategy minimizes x^T x / 2
+subject to M x <= 0, x >= 0, sum(x) = 1, and its KKT conditions are
+    x = nu 1 - M^T lambda + mu,   lambda, mu >= 0,
+    lambda_i (M x)_i = 0,  mu_i x_i = 0.
+Given the support F = { i : x_i > threshold } and the active rows
+R = { i : (M x)_i >= -threshold } (with M scaled to entries in [-1,1]), x_F and
+(lambda_R, nu) solve the linear system
+    x_F + M_RF^T lambda_R - nu 1 = 0,   M_RF x_F = 0,   sum(x_F) = 1,
+which is solved by one symmetric indefinite factorization (sysv), after
+dropping one row of F from R (x_F^T M_FF = 0, so those rows are dependent), or
+by an SVD if it is still singular.  Since M^T x is zero on F, lambda_R may be
+shifted by any multiple of x_R, which is used to make the multipliers
+nonnegative where possible.  The result is accepted if the system is
+consistent and x >= 0, M x <= 0, lambda >= 0 and mu_i = (M^T lambda)_i - nu >= 0
+off F all hold to within polish_tolerance; then it is the balanced strategy to
+machine precision, with exact zeros off the support.  Otherwise (a wrong guess
+of the active set, or a game with many ties, where tight rows outside the
+support need multipliers that this choice does not find) polishing fails, and
+polished_qp_solver falls back to a tight-tolerance solve.
+
+On random games with m = 10..300 candidates polishing succeeds almost always,
+but with margins in {-3..3} (many ties) it fails for a third of the small
+games and all the large ones.  The loose solve saves only one to three of the
+16-20 interior-point iterations, so polishing costs a little time overall
+(about 20% for polished_qp_solver against qp_solver); what it buys is accuracy
+and exact supports.  So the solver backends do not polish, and polishing is
+only used where exact supports are needed (parametric_path).
+
+Members of F whose solved x_i is zero (to within polish_tolerance) are dropped
+from F and the system solved again, since their multipliers cannot be shifted
+(and shifting by lambda_j / x_j for a tiny x_j would pass any sign check).
+"""
+
+polish_feastol = 1e-5                   # tolerances of the loose solve
+polish_abstol = 1e-6
+polish_threshold = 1e-5                 # for guessing the support and the active rows
+polish_tolerance = 1e-9                 # for accepting the polished solution
+polish_stats = { "polished": 0, "failed": 0 }
+
+def min_norm_solve(B,e):
+    """
+    Return (y,residual): the least-norm least-squares solution y of B y = e (B a
+    cvxopt matrix, e a column), using the SVD of B, and the largest absolute
+    entry of B y - e.
+    """
+    (rows,cols) = B.size
+    k = min(rows,cols)
+    S = matrix(0.0, (k, 1))
+    U = matrix(0.0, (rows, k))
+    Vt = matrix(0.0, (k, cols))
+    lapack.gesvd(+B, S, jobu='S', jobvt='S', U=U, Vt=Vt)
+    c = U.T * e
+    cutoff = max(rows,cols) * 1e-14 * S[0]
+    for i in range(k):
+        if S[i] > cutoff:
+            c[i] = c[i] / S[i]
+        else:
+            c[i] = 0.0
+    y = Vt.T * c
+    residual = max(abs(B * y - e))
+    return (y,residual)
+
+def polish_strategy(payoff,x,threshold=None,tolerance=None):
+    """
+    Return the balanced optimal mixed strategy (a list) for the symmetric game with
+    given (antisymmetric) payoff matrix (list of rows), found by solving the KKT
+    conditions on the active set suggested by the approximate solution x (see
+    above), or None if that active set does not give a certified solution.
+    """
+    if threshold == None:
+        threshold = polish_threshold
+    if tolerance == None:
+        tolerance = polish_tolerance
+    m = len(payoff)
+    scale = float(max([ abs(pij) for row in payoff for pij in row ] + [ 0 ]))
+    if scale == 0.0:
+        return [ 1.0/m ] * m
+    M = matrix(payoff).trans() / scale
+    g = M * matrix(x)
+    F = [ i for i in range(m) if x[i] > threshold ]
+    R = [ i for i in range(m) if g[i] >= -threshold ]
+    if F == [ ]:
+        return None
+    x = solve_active_set(M,F,R,max(F,key=lambda i: x[i]),tolerance)
+    if x == None:
+        return None
+    return normalized_strategy(x)
+
+def solve_active_set(M,F,R,i0,tolerance):
+    """
+    Return the solution x (a cvxopt matrix) of the KKT conditions for the balanced
+    strategy of the game with antisymmetric payoff matrix M (a cvxopt matrix, scaled
+    to entries in [-1,1]) with support F and tight rows R (lists of indices), if
+    it is certified optimal to within tolerance (see above), else None.  Row i0
+    (in F) is the row left out of the linear system.
+    """
+    m = M.size[0]
+    # x_F + B^T u = 0, B x_F = e for B = [ M_R'F ; 1^T ], where R' is R without one
+    # row of F (the rows of M_FF are dependent, since x_F^T M_FF = 0)
+    R = [ i for i in R if i != i0 ]
+    k = len(F)
+    B = matrix([ M[R,F], matrix(1.0, (1, k)) ])
+    K = matrix([ [ identity(k), B ], [ B.T, matrix(0.0, (len(R)+1, len(R)+1)) ] ])
+    e = matrix([ 0.0 ] * (k+len(R)) + [ 1.0 ])
+    try:
+        u = +e
+        lapack.sysv(+K, u)
+        residual = max(abs(K * u - e))
+    except ArithmeticError:                      # singular: degenerate active set
+        (u,residual) = min_norm_solve(K,e)
+    if residual > tolerance or min(u[:k]) < -tolerance:
+        return None
+    # a member of F with x_i = 0 is really outside the support (and its multiplier
+    # could not be shifted, below); so solve again without it
+    zeros = [ i for (j,i) in enumerate(F) if u[j] <= tolerance ]
+    if zeros != [ ]:
+        if len(zeros) == k:
+            return None
+        return solve_active_set(M,[ i for i in F if i not in zeros ],R + [ i0 ],
+                                max([ i for i in F if i not in zeros ],key=lambda i: u[F.index(i)]),
+                                tolerance)
+    x = matrix(0.0, (m, 1))
+    for (j,i) in enumerate(F):
+        x[i] = max(0.0,u[j])
+    if max(M * x) > tolerance:
+        return None
+    w = u[k:]
+    R = R + [ i0 ]                               # with lambda_i0 = 0
+    # Since M^T x = -M x is zero on F, adding t x_R to lambda_R keeps the
+    # stationarity equations, and adds -t (M x)_i >= 0 to mu_i off F; so shift
+    # the least-norm multipliers by the smallest t >= 0 making lambda >= 0 and
+    # mu_i >= 0 wherever (M x)_i < 0.  Only mu_i for tight rows off F can then
+    # still be negative.
+    g = M * x
+    lam = matrix(list(w[:len(R)-1]) + [ 0.0 ])
+    nu = -w[len(R)-1]
+    out = [ i for i in range(m) if x[i] == 0.0 ]
+    if out != [ ]:
+        mu = M[R,out].T * lam - nu
+    t = 0.0
+    for (j,i) in enumerate(R):
+        if lam[j] < 0.0 and x[i] > tolerance:
+            t = max(t,-lam[j]/x[i])
+    for (j,i) in enumerate(out):
+        if mu[j] < 0.0 and g[i] < -tolerance:
+            t = max(t,mu[j]/g[i])
+    lam = lam + t * x[R]
+    if min(lam) < -tolerance:
+        return None
+    if out != [ ] and min(mu - t * g[out]) < -tolerance:
+        return None
+    return x
+
+def polished_qp_solver(payoff):
+    """
+    Return the balanced optimal mixed strategy, like qp_solver, by a loose-tolerance
+    solve followed by active-set polishing (see polish_strategy), falling back to
+    qp_solver at its usual tolerances if polishing fails or the game is not symmetric.
+    """
+    if not is_antisymmetric(payoff):
+        return qp_solver(payoff)
+    x = polish_strategy(payoff,qp_solver(payoff,polish_feastol,polish_abstol))
+    with stats_lock:
+        if x == None:
+            polish_stats["failed"] += 1
+        else:
+            polish_stats["polished"] += 1
+    if x == None:
+        return qp_solver(payoff)
+    return x
+
+####################################################################################
+### Optimality and uniqueness certificates
+####################################################################################
+
+"""
+certify_strategy checks a proposed solution x of a symmetric game (antisymmetric
+M) directly, instead of comparing the solutions of two solvers.  x is optimal iff
+x >= 0, sum(x) = 1 and M x <= 0 (the value is zero); that takes O(m**2) time.
+Whether it is the *only* optimal strategy follows from the active constraints.
+Let F be the support of x, and R the tight rows { i : (M x)_i = 0 } (F is a
+subset of R).  Every optimal y has y_i = 0 off R (complementary slackness, with
+x as the dual solution) and (M y)_i = 0 on F; so y - x is a direction d with
+    d_i = 0 off R,  sum(d) = 0,  M_FR d_R = 0,
+    d_i >= 0 and (M d)_i <= 0 for i in D = R - F,
+and conversely a small enough step from x along any such d stays optimal.
+    -- If [ M_RF ; 1^T ] has rank less than |F|, a nonzero d with d_D = 0 lies in
+       its null space (and is feasible in both directions): not unique.
+    -- Otherwise, if D is empty, x is the unique optimal strategy.
+    -- Otherwise every nonzero such d has d_D != 0 or (M d)_D != 0, so x is
+       unique iff the small LP
+           maximize sum(d_D) - sum((M d)_D)  subject to  the above,
+                                              sum(d_D) - sum((M d)_D) <= 1
+       has optimum zero.  (It is posed on a basis of the null space of
+       [ M_FR ; 1^T ], found by a second SVD, so it has no equality constraints.)
+The ranks are computed with SVDs; entries are compared to zero with tolerance
+certify_tolerance (relative to the largest absolute payoff).
+"""
+
+certify_tolerance = 1e-7
+
+def certify_strategy(payoff,x,tolerance=None):
+    """
+    Return (optimal,unique) for mixed strategy x (a list) of the symmetric game with
+    given (antisymmetric) payoff matrix (list of rows): optimal is True if x is an
+    optimal strategy, and unique is True if it is the only one (None if x is not
+    optimal).  See above.
+    """
+    if tolerance == None:
+        tolerance = certify_tolerance
+    m = len(payoff)
+    scale = float(max([ abs(pij) for row in payoff for pij in row ] + [ 0 ]))
+    if scale == 0.0:
+        return (min(x) >= -tolerance and abs(sum(x)-1.0) <= tolerance, m == 1)
+    M = matrix(payoff).trans() / scale
+    g = M * matrix([ float(xi) for xi in x ])
+    if min(x) < -tolerance or abs(sum(x)-1.0) > tolerance or max(g) > tolerance:
+        return (False,None)
+    F = [ i for i in range(m) if x[i] > tolerance ]
+    R = [ i for i in range(m) if g[i] >= -tolerance ]
+    D = [ i for i in R if i not in set(F) ]
+    B = matrix([ M[R,F], matrix(1.0, (1, len(F))) ])
+    S = matrix(0.0, (min(B.size), 1))
+    lapack.gesvd(+B, S)
+    rank = len([ sigma for sigma in S if sigma > max(B.size) * tolerance * S[0] ])
+    if rank < len(F):
+        return (True,False)
+    if D == [ ]:
+        return (True,True)
+    # The directions d_R with sum(d) = 0 and M_FR d = 0 are d_R = N z, for N a basis
+    # of the null space of E = [ M_FR ; 1^T ].  x is unique iff the LP
+    #     maximize  t(z) = sum(d_D) - sum((M d)_D)  s.t.  d_D >= 0, (M d)_D <= 0, t(z) <= 1
+    # has optimum zero (t is zero only at d = 0, by the rank test above).
+    E = matrix([ M[F,R], matrix(1.0, (1, len(R))) ])
+    S = matrix(0.0, (min(E.size), 1))
+    Vt = matrix(0.0, (len(R), len(R)))
+    lapack.gesvd(+E, S, jobvt='A', Vt=Vt)
+    rank = len([ sigma for sigma in S if sigma > max(E.size) * tolerance * S[0] ])
+    if rank == len(R):
+        return (True,True)
+    N = Vt[rank:,:].T
+    position = dict([ (i,j) for (j,i) in enumerate(R) ])
+    N_D = N[[ position[i] for i in D ],:]
+    MN_D = M[D,R] * N
+    t = matrix(1.0, (1, len(D))) * (N_D - MN_D)
+    G = matrix([ -N_D, MN_D, t ])
+    h = matrix([ 0.0 ] * (2*len(D)) + [ 1.0 ])
+    options = solver_options(lp_options)
+    sol = logged_solve("certify_strategy", "lp", payoff, options,
+                       lambda: solvers.lp(-t.T, G, h, options=options))
+    if sol['status'] != 'optimal':
+        return (True,None)
+    return (True, -sol['primal objective'] <= 1e-6)
+
+####################################################################################
+### Structured QP solver (no shift; identity blocks never formed)
+####################################################################################
+
+"""
+qp_solver shifts the payoffs by v to make them positive and stacks -M on a dense
+-identity(m), so it builds a dense 2m x m G and a dense m x m P.  For a symmetric
+game (antisymmetric M, value zero) no shift is needed: the balanced strategy is
+the solution of
+    minimize (1/2) x^T x  subject to  M x <= 0,  -x <= 0,  sum(x) = 1.
+structured_qp_solver solves this with CVXOPT's coneqp, giving P as a sparse
+identity (spmatrix), G = [M; -I] as a function that applies M and -I without
+forming G, and its own KKT solver.  After eliminating the inequality multipliers
+the KKT system is
+    (I + M^T D1^-2 M + D2^-2) ux + 1 uy = rhs,   1^T ux = by,
+where D1 and D2 are the diagonal scalings of the two blocks of inequalities;
+this is factored once per iteration by one symmetric rank-m update (syrk) and
+one Cholesky factorization of an m x m matrix, with the equality constraint
+handled by its 1 x 1 Schur complement.
+
+The dense m x m product M^T D1^-2 M dominates both formulations (the margin
+block is dense, so a sparse factorization of [M; -I] only adds fill-in and
+overhead: making G an spmatrix was 10-20 times slower for m = 100..400).  So
+the structured solver takes about as long as qp_solver, but needs about 2 m**2
+fewer doubles of storage (no dense G or P).  Non-symmetric games are passed on
+to qp_solver, since their value (and so the right-hand side) is unknown.
+"""
+
+def structured_qp_solver(payoff):
+    """
+    Return the balanced optimal mixed strategy for the symmetric game with given
+    (antisymmetric) payoff matrix (list of rows), like qp_solver, but without the
+    shift and with the identity blocks handled implicitly (see above).
+    """
+    if not is_antisymmetric(payoff):
+        return qp_solver(payoff)
+    m = len(payoff)
+    M = matrix(conditioned_payoff(payoff)).trans()
+
+    def G(x,y,alpha=1.0,beta=0.0,trans='N'):
+        # y := alpha * G x + beta * y  (or G^T x if trans == 'T'), for G = [M; -I]
+        if trans == 'N':
+            y[:m] = alpha * (M * x) + beta * y[:m]
+            y[m:] = -alpha * x + beta * y[m:]
+        else:
+            y[:] = alpha * (M.T * x[:m] - x[m:]) + beta * y
+
+    def kktsolver(W):
+        d = W['d']
+        d_squared = mul(d,d)
+        M_scaled = spdiag(div(1.0,d[:m])) * M
+        H = matrix(0.0, (m, m))
+        blas.syrk(M_scaled, H, trans='T')        # lower triangle of M^T D1^-2 M
+        H[::m+1] += 1.0 + div(1.0,d_squared[m:])
+        lapack.potrf(H)
+        H_ones = matrix(1.0, (m, 1))
+        lapack.potrs(H, H_ones)
+        schur = sum(H_ones)
+        def solve(x,y,z):
+            z_scaled = div(z,d_squared)
+            r = x + M.T * z_scaled[:m] - z_scaled[m:]
+            lapack.potrs(H, r)
+            y[0] = (sum(r) - y[0]) / schur
+            x[:] = r - y[0] * H_ones
+            z[:] = div(matrix([M * x, -x]) - z, d)
+        return solve
+
+    P = spmatrix(1.0, range(m), range(m))
+    q = matrix(0.0, (m, 1))
+    h = matrix(0.0, (2*m, 1))
+    A = matrix(1.0, (1, m))
+    b = matrix(1.0)
+    dims = { 'l': 2*m, 'q': [], 's': [] }
+    options = solver_options(qp_options)
+    x = logged_solve("structured_qp_solver", "qp", payoff, options,
+                     lambda: solvers.coneqp(P, q, G, h, dims, A, b, kktsolver=kktsolver,
+                                            options=options))['x']
+    return normalized_strategy(x)
+
+####################################################################################
+### Stateful solver with warm starts (for sequences of related games)
+####################################################################################
+
+class GameSolver(object):
+    """
+    Stateful LP and QP solver for games with m strategies.
+
+    Its methods lp_solver and qp_solver are drop-in replacements for the functions
+    of the same names, but the parts of the problem that depend only on m
+    (P, q, h, A, c and the nonnegativity block of G) are built once, and the
+    primal and dual solutions of the previous solve of each kind are kept.
+    For the kinds ("lp" and/or "qp") listed in warm_start, they are used as the
+    starting point of the next solve, after rescaling for the new game's shift constant v and pushing the
+    slacks s and multipliers z at least interior_margin/v (for LP multipliers,
+    interior_margin) into the interior.
+
+    This helps the QP when successive games differ only slightly (successive trials,
+    live tallies after a small ballot delta), and generally hurts for unrelated games.
+    The interior-point LP rarely gains from it, so by default only the QP is warm-started.
+    If a warm-started solve does not reach status 'optimal', it is repeated cold.
+
+    The iteration count of each solve is recorded in last_iterations[kind].
+    The iterations saved by a warm start are estimated against the average
+    iteration count of the cold solves of that kind so far, and accumulated
+    in stats[kind]["iterations saved"] (this can be negative).
+    """
+
+    def __init__(self,m,warm_start=("qp",),interior_margin=0.01):
+        self.m = m
+        self.warm_start = warm_start
+        self.interior_margin = interior_margin
+        self.I = identity(m)
+        self.P = identity(m)                          # for QP objective
+        self.q = matrix([0.0]*m)
+        self.c = matrix(1.0, (m, 1))                  # for LP objective
+        self.h = matrix([-1.0]*m + [0.0]*m)
+        self.A = matrix(1.0, (1, m))
+        self.G = matrix([matrix(0.0, (m, m)), -self.I])
+        self.previous = { "lp": None, "qp": None }
+        self.last_iterations = { "lp": None, "qp": None }
+        self.stats = { }
+        for kind in ["lp","qp"]:
+            self.stats[kind] = { "solves": 0, "warm solves": 0, "cold solves": 0,
+                                 "cold iterations": 0, "warm iterations": 0,
+                                 "iterations saved": 0.0 }
+
+    def setup(self,payoff):
+        """
+        Set the top block of G to -M for this game's shifted (conditioned) matrix M; return v.
+        """
+        m = self.m
+        M = -matrix(conditioned_payoff(payoff)).trans()
+        v = max(1.0, -2.0 * min(M))
+        self.G[:m,:] = -(M + v)
+        return v
+
+    def start(self,kind,v):
+        """
+        Return the warm-start (x,s,y,z) for a game with shift constant v, or None.
+        """
+        if kind not in self.warm_start or self.previous[kind] == None:
+            return None
+        (x,y,z,v_prev) = self.previous[kind]
+        x = x * (v_prev / v)
+        s = self.h - self.G * x
+        floor = self.interior_margin / v
+        for i in range(len(s)):
+            s[i] = max(s[i], floor)
+        if kind == "lp":
+            floor = self.interior_margin          # LP multipliers are not scaled by 1/v
+        z = +z
+        for i in range(len(z)):
+            z[i] = max(z[i], floor)
+        return (x,s,y,z)
+
+    def solve(self,kind,v,payoff):
+        """
+        Solve the current problem (for the given payoff matrix; warm if possible);
+        return the solution dict.
+        """
+        if kind == "qp":
+            options = solver_options(qp_options)
+        else:
+            options = solver_options(lp_options)
+        start = self.start(kind,v)
+        sol = None
+        if start != None:
+            (x,s,y,z) = start
+            try:
+                if kind == "qp":
+                    call = lambda: solvers.qp(self.P, self.q, self.G, self.h, self.A, matrix(1.0/v),
+                                              initvals = { 'x': x, 's': s, 'y': y, 'z': z },
+                                              options = options)
+                else:
+                    call = lambda: solvers.lp(self.c, self.G, self.h,
+                                              primalstart = { 'x': x, 's': s },
+                                              dualstart = { 'z': z },
+                                              options = options)
+                sol = logged_solve("GameSolver warm", kind, payoff, options, call)
+            except (ValueError, ArithmeticError):
+                sol = None
+            if sol != None and sol['status'] != 'optimal':
+                sol = None
+        stats = self.stats[kind]
+        stats["solves"] += 1
+        if sol != None:
+            stats["warm solves"] += 1
+            stats["warm iterations"] += sol['iterations']
+            if stats["cold solves"] > 0:
+                average_cold = float(stats["cold iterations"]) / stats["cold solves"]
+                stats["iterations saved"] += average_cold - sol['iterations']
+        else:
+            if kind == "qp":
+                call = lambda: solvers.qp(self.P, self.q, self.G, self.h, self.A, matrix(1.0/v),
+                                          options = options)
+            else:
+                call = lambda: solvers.lp(self.c, self.G, self.h, options = options)
+            sol = logged_solve("GameSolver", kind, payoff, options, call)
+            stats["cold solves"] += 1
+            stats["cold iterations"] += sol['iterations']
+        self.last_iterations[kind] = sol['iterations']
+        self.previous[kind] = (+sol['x'], +sol['y'], +sol['z'], v)
+        return sol
+
+    def lp_solver(self,payoff):
+        """
+        Same as lp_solver(payoff), but warm-started from the previous LP solve.
+        """
+        v = self.setup(payoff)
+        x = self.solve("lp",v,payoff)['x']
+        return normalized_strategy(x)
+
+    def qp_solver(self,payoff):
+        """
+        Same as qp_solver(payoff), but warm-started from the previous QP solve.
+        """
+        v = self.setup(payoff)
+        x = self.solve("qp",v,payoff)['x']
+        return normalized_strategy(x)
+
+def normalized_strategy(x):
+    """
+    Round slightly negative entries of solver output x up to zero, and
+    normalize to give a probability distribution (a list).
+    """
+    x = [ max(0.0,xi) for xi in x ]
+    sumx = sum(x)
+    return [ xi / sumx for xi in x ]
+
+####################################################################################
+### Exact solver for small games (support enumeration)
+####################################################################################
+
+"""
+For a game with few strategies the optimal mixed strategies can be found
+exactly, without an iterative solver, by enumerating supports.
+
+For a symmetric zero-sum game (antisymmetric payoff matrix M, value zero) the
+optimal mixed strategies are the p with p >= 0, sum(p) = 1 and M p <= 0.  These
+form a polytope, and each vertex p of it, with support S, is the unique
+solution of
+     (M p)_i = 0 for i in S and for i in a set T of rows outside S,
+     sum(p) = 1, p_j = 0 for j not in S,
+where T is empty unless the equations for S alone are singular.  So
+support_enumeration_vertices tries the supports S in increasing size, solves
+those small linear systems exactly (with integer arithmetic), and keeps each
+solution that is nonnegative and satisfies M p <= 0.
+
+If some vertex p has a nonsingular support S and (M p)_j < 0 strictly for every
+j outside S, then p is the unique optimal strategy, and the search stops there.
+(This is the usual case, e.g. with an odd number of voters.)  Otherwise all
+vertices are found, and the balanced optimal strategy -- the point of minimum
+sum of squares in their convex hull -- is found by Wolfe's minimum-norm-point
+algorithm, again in exact (rational) arithmetic.
+
+The work grows as 2**m, and is largest when there are many ties (so that many
+of the small systems are singular).  Up to exact_max_size = 6 it is several
+times faster than the CVXOPT QP when there are no ties, and within a small
+factor of it even when there are many (e.g. with only a handful of voters).
+Entries of the payoff matrix may be integers, floats, or Fractions; floats are
+converted exactly.
+"""
+
+def fraction_gcd(a,b):
+    while b:
+        a,b = b, a % b
+    return a
+
+def integer_matrix(payoff):
+    """
+    Return payoff matrix (list of rows) scaled by a positive constant to have
+    integer entries (a list of lists of ints).
+    """
+    F = [ [ Fraction(x) for x in row ] for row in payoff ]
+    d = 1
+    for row in F:
+        for x in row:
+            d = d * x.denominator // fraction_gcd(d,x.denominator)
+    return [ [ int(x * d) for x in row ] for row in F ]
+
+def exact_linear_solve(A,b):
+    """
+    Solve A x = b exactly, where A is a list of rows of ints and b a list of ints.
+    Uses fraction-free (Bareiss) elimination, so all arithmetic is on integers.
+    Return ("unique",(y,d)) where x = y/d, y is a list of ints and d is a positive
+    int; ("many",rank) if the system is consistent but A has rank less than its
+    number of columns; or ("none",rank) if the system is inconsistent.
+    """
+    rows = [ list(A[i]) + [ b[i] ] for i in range(len(A)) ]
+    n = len(A[0])
+    prev = 1
+    r = 0                                   # number of pivots so far
+    for c in range(n):
+        p = r
+        while p < len(rows) and rows[p][c] == 0:
+            p += 1
+        if p == len(rows):
+            continue
+        rows[r],rows[p] = rows[p],rows[r]
+        pr = rows[r]
+        for i in range(r+1,len(rows)):
+            ri = rows[i]
+            f = ri[c]
+            for j in range(c,n+1):
+                ri[j] = (pr[c]*ri[j] - f*pr[j]) // prev
+        prev = pr[c]
+        r += 1
+    for i in range(r,len(rows)):
+        if rows[i][n] != 0:
+            return ("none",r)
+    if r < n:
+        return ("many",r)
+    # back substitution for y = d x, where d = last pivot (a determinant, so y is integral)
+    d = rows[n-1][n-1]
+    y = [ 0 ] * n
+    for i in range(n-1,-1,-1):
+        s = d * rows[i][n]
+        for j in range(i+1,n):
+            s -= rows[i][j] * y[j]
+        y[i] = s // rows[i][i]
+    if d < 0:
+        d = -d
+        y = [ -yi for yi in y ]
+    return ("unique",(y,d))
+
+def support_enumeration_vertices(payoff,stop_if_unique=True):
+    """
+    Return (vertices,unique) for symmetric zero-sum game with given payoff matrix
+    (a list of rows; it should be antisymmetric).  vertices is a list of the
+    vertices of the polytope of optimal mixed strategies (each a list of Fractions),
+    in order of increasing support size.  If stop_if_unique is True and the optimal
+    mixed strategy is found to be unique, the search stops early and unique is True
+    (and vertices is just that one strategy).
+    """
+    M = integer_matrix(payoff)
+    m = len(M)
+    vertices = [ ]
+    seen = set()
+    for k in range(1,m+1):
+        for S in itertools.combinations(range(m),k):
+            others = [ j for j in range(m) if j not in S ]
+            A = [ [ M[i][j] for j in S ] for i in S ] + [ [ 1 ] * k ]
+            b = [ 0 ] * k + [ 1 ]
+            (status,solution) = exact_linear_solve(A,b)
+            if status == "unique":
+                candidates = [ solution ]
+            elif status == "many":
+                # singular: add tight rows from outside S to pin down the vertices
+                candidates = [ ]
+                for T in itertools.combinations(others,k-solution):
+                    (status_T,solution_T) = exact_linear_solve(A + [ [ M[i][j] for j in S ] for i in T ],
+                                                               b + [ 0 ] * len(T))
+                    if status_T == "unique":
+                        candidates.append(solution_T)
+            else:
+                continue
+            for (y,d) in candidates:
+                if min(y) < 0:
+                    continue
+                slack = [ sum([ M[j][S[t]] * y[t] for t in range(k) ]) for j in others ]
+                if slack and max(slack) > 0:
+                    continue
+                p = [ Fraction(0) ] * m
+                for t in range(k):
+                    p[S[t]] = Fraction(y[t],d)
+                if tuple(p) in seen:
+                    continue
+                seen.add(tuple(p))
+                vertices.append(p)
+                if stop_if_unique and status == "unique" and min(y) > 0 \
+                        and (slack == [ ] or max(slack) < 0):
+                    return ([ p ],True)
+    return (vertices,False)
+
+def min_norm_point(points):
+    """
+    Return the point of minimum Euclidean norm in the convex hull of the given points
+    (lists of Fractions), using Wolfe's algorithm in exact arithmetic.
+    """
+    def dot(u,v):
+        return sum([ ui*vi for (ui,vi) in zip(u,v) ])
+    def combination(S,weights):
+        return [ sum([ w*points[j][i] for (j,w) in zip(S,weights) ]) for i in range(len(points[0])) ]
+    def affine_minimizer(S):
+        # minimize |sum_j a_j points[j]|^2 subject to sum_j a_j = 1
+        k = len(S)
+        G = [ [ dot(points[i],points[j]) for j in S ] + [ Fraction(1) ] for i in S ]
+        G.append([ Fraction(1) ] * k + [ Fraction(0) ])
+        d = 1
+        for row in G:
+            for g in row:
+                d = d * g.denominator // fraction_gcd(d,g.denominator)
+        (status,(y,e)) = exact_linear_solve([ [ int(g*d) for g in row ] for row in G ],
+                                            [ 0 ] * k + [ d ])
+        return [ Fraction(yi,e) for yi in y[:k] ]
+    j0 = min(range(len(points)), key=lambda j: dot(points[j],points[j]))
+    S = [ j0 ]
+    weights = [ Fraction(1) ]
+    x = points[j0]
+    while True:
+        j = min(range(len(points)), key=lambda j: dot(x,points[j]))
+        if dot(x,points[j]) >= dot(x,x) or j in S:
+            return x
+        S.append(j)
+        weights.append(Fraction(0))
+        while True:
+            a = affine_minimizer(S)
+            if min(a) > 0:
+                weights = a
+                break
+            theta = min([ weights[t] / (weights[t] - a[t]) for t in range(len(S)) if a[t] <= 0 ])
+            weights = [ theta*a[t] + (1-theta)*weights[t] for t in range(len(S)) ]
+            S = [ S[t] for t in range(len(S)) if weights[t] > 0 ]
+            weights = [ w for w in weights if w > 0 ]
+        x = combination(S,weights)
+
+def is_antisymmetric(payoff):
+    m = len(payoff)
+    return all([ payoff[i][j] == -payoff[j][i] for i in range(m) for j in range(i,m) ])
+
+def exact_balanced_strategy(payoff):
+    """
+    Return the balanced optimal mixed strategy (a list of Fractions) for the symmetric
+    zero-sum game with given (antisymmetric) payoff matrix, by support enumeration.
+    """
+    (vertices,unique) = support_enumeration_vertices(payoff)
+    if unique or len(vertices) == 1:
+        return vertices[0]
+    return min_norm_point(vertices)
+
+def exact_optimal_strategy(payoff):
+    """
+    Return *some* optimal mixed strategy (a list of Fractions): a vertex of smallest
+    support of the polytope of optimal strategies.
+    """
+    (vertices,unique) = support_enumeration_vertices(payoff)
+    return vertices[0]
+
+####################################################################################
+### Exact solver for larger games (rational simplex + active set)
+####################################################################################
+
+"""
+For larger symmetric games, where enumerating supports is too slow, the
+optimal mixed strategies are still rational and can be found exactly:
+   -- exact_simplex_strategy finds *some* optimal mixed strategy by the simplex
+      method, using integer pivoting (every tableau entry is kept as an integer
+      multiple of the current pivot determinant, so there is no rounding and
+      no gcd computation) and Bland's rule (so degenerate games cannot cycle);
+   -- exact_active_set_balancing then moves from that strategy to the balanced
+      one by a primal active-set method for the problem
+          minimize sum(p**2)  subject to  M p <= 0, sum(p) = 1, p >= 0,
+      in rational arithmetic.  Each step projects onto the affine set given
+      by the constraints in the current working set, which only needs the
+      solution of a small integer linear system (of size one more than the
+      number of tight rows).
+exact_solve_game chooses between these and support enumeration; it returns
+lists of Fractions.  The cost is a few tens of milliseconds at m = 30.
+"""
+
+support_enumeration_max_size = 6         # exact_solve_game enumerates supports up to this size
+
+def exact_simplex_strategy(payoff):
+    """
+    Return an optimal mixed strategy (a list of Fractions, a vertex of the polytope
+    of optimal strategies) for the game with given payoff matrix (list of rows),
+    found by the simplex method in exact integer arithmetic.
+
+    The payoff matrix is shifted to have all entries positive (B = M + shift);
+    then the strategy is y/sum(y), where y solves the LP
+        maximize sum(y)  subject to  B y <= 1, y >= 0.
+    """
+    M = integer_matrix(payoff)
+    m = len(M)
+    shift = 1 + max([ abs(x) for row in M for x in row ])
+    # tableau: m constraint rows, then the objective row; columns y, slacks, rhs
+    T = [ [ M[i][j] + shift for j in range(m) ] + [ int(i == j) for j in range(m) ] + [ 1 ]
+          for i in range(m) ]
+    T.append([ -1 ] * m + [ 0 ] * m + [ 0 ])
+    basis = range(m,2*m)
+    rhs = 2*m
+    det = 1
+    while True:
+        entering = [ j for j in range(2*m) if T[m][j] < 0 ]
+        if entering == [ ]:
+            break
+        s = entering[0]                          # Bland's rule
+        r = None
+        for i in range(m):
+            if T[i][s] > 0:
+                if r == None:
+                    r = i
+                    continue
+                # compare ratios T[i][rhs]/T[i][s] and T[r][rhs]/T[r][s]
+                lhs = T[i][rhs] * T[r][s]
+                rhs_r = T[r][rhs] * T[i][s]
+                if lhs < rhs_r or (lhs == rhs_r and basis[i] < basis[r]):
+                    r = i
+        pivot = T[r][s]
+        pivot_row = T[r]
+        for i in range(m+1):
+            if i == r:
+                continue
+            row = T[i]
+            f = row[s]
+            for j in range(rhs+1):
+                row[j] = (pivot * row[j] - f * pivot_row[j]) // det
+        det = pivot
+        basis[r] = s
+    total = T[m][rhs]                            # det * sum(y)
+    p = [ Fraction(0) ] * m
+    for i in range(m):
+        if basis[i] < m:
+            p[basis[i]] = Fraction(T[i][rhs],total)
+    return p
+
+def exact_active_set_balancing(payoff,p,multiplicity=None):
+    """
+    Return the balanced optimal mixed strategy (a list of Fractions) for the symmetric
+    zero-sum game with given (antisymmetric) payoff matrix, starting from optimal
+    mixed strategy p (a list of Fractions), by a primal active-set method.
+    If multiplicity (a list of positive ints) is given, the optimal strategy minimizing
+    sum(p[j]**2 / multiplicity[j]) is returned instead; this is the balanced strategy
+    of the game in which strategy j has multiplicity[j] identical copies (clones),
+    with the probability of j shared equally among its copies.
+
+    The working set consists of the tight rows R (where (M p)_i = 0) and the zero
+    coordinates of p; F is the list of the other (free) coordinates.
+    """
+    M = integer_matrix(payoff)
+    m = len(M)
+    if multiplicity == None:
+        multiplicity = [ 1 ] * m
+    p = list(p)
+    F = [ j for j in range(m) if p[j] > 0 ]
+    R = [ ]
+    while True:
+        # q = point of minimum (weighted) norm with q_j = 0 (j not in F), M_RF q_F = 0,
+        # sum(q_F) = 1; q_F = K A^T w, where A = [ M_RF ; 1 ], K = diag(multiplicity_F),
+        # and (A K A^T) w = (0,...,0,1)
+        A = [ [ M[i][j] for j in F ] for i in R ] + [ [ 1 ] * len(F) ]
+        K = [ multiplicity[j] for j in F ]
+        G = [ [ sum([ a*k*b for (a,k,b) in zip(Ai,K,Ak) ]) for Ak in A ] for Ai in A ]
+        (status,solution) = exact_linear_solve(G,[ 0 ] * len(R) + [ 1 ])
+        if status != "unique":
+            # rows of M_RF became linearly dependent (after F shrank); the dependent
+            # ones are implied by the others, so keep a maximal independent subset
+            kept = [ ]
+            for i in R:
+                B = [ [ M[r][j] for j in F ] for r in kept + [ i ] ] + [ [ 1 ] * len(F) ]
+                H = [ [ sum([ a*k*b for (a,k,b) in zip(Bi,K,Bk) ]) for Bk in B ] for Bi in B ]
+                if exact_linear_solve(H,[ 0 ] * (len(kept) + 1) + [ 1 ])[0] == "unique":
+                    kept.append(i)
+            if len(kept) < len(R):
+                R = kept
+                continue
+            if multiplicity == [ 1 ] * m:
+                return exact_balanced_strategy(payoff)
+            raise ValueError, "exact active-set balancing: singular working set"
+        (w,d) = solution
+        q = [ Fraction(0) ] * m
+        for (t,j) in enumerate(F):
+            q[j] = Fraction(K[t] * sum([ A[a][t] * w[a] for a in range(len(A)) ]),d)
+        if q == p:
+            # stationary on working set: check multipliers (scaled by d > 0).
+            # row i in R has multiplier -w_i; zero coordinate j has multiplier
+            # -sum_i M[i][j] w_i - w_last.
+            worst = (0,None,None)
+            for (a,i) in enumerate(R):
+                if -w[a] < worst[0]:
+                    worst = (-w[a],"row",i)
+            for j in range(m):
+                if j not in F:
+                    mu = - sum([ M[i][j] * w[a] for (a,i) in enumerate(R) ]) - w[-1]
+                    if mu < worst[0]:
+                        worst = (mu,"bound",j)
+            if worst[1] == None:
+                return p
+            if worst[1] == "row":
+                R.remove(worst[2])
+            else:
+                F.append(worst[2])
+            continue
+        # move towards q until blocked by a constraint not in the working set
+        step = [ q[j] - p[j] for j in range(m) ]
+        alpha = Fraction(1)
+        blocking = None
+        for j in F:
+            if step[j] < 0 and -p[j] / step[j] < alpha:
+                alpha = -p[j] / step[j]
+                blocking = ("bound",j)
+        for i in range(m):
+            if i not in R:
+                Mstep = sum([ M[i][j] * step[j] for j in F ])
+                if Mstep > 0:
+                    Mp = sum([ M[i][j] * p[j] for j in F ])
+                    if -Mp / Mstep < alpha:
+                        alpha = -Mp / Mstep
+                        blocking = ("row",i)
+        p = [ p[j] + alpha * step[j] for j in range(m) ]
+        if blocking != None:
+            if blocking[0] == "bound":
+                F.remove(blocking[1])
+                p[blocking[1]] = Fraction(0)
+            else:
+                R.append(blocking[1])
+
+def exact_solve_game(payoff,kind="qp",multiplicity=None):
+    """
+    Solve symmetric zero-sum game with given (antisymmetric) payoff matrix exactly.
+    kind is "qp" for the balanced optimal mixed strategy, "lp" for some optimal
+    mixed strategy (a vertex of the polytope of optimal strategies).
+    multiplicity, if given, weights the balancing (see exact_active_set_balancing).
+    Return a list of Fractions.
+    """
+    if len(payoff) <= support_enumeration_max_size and multiplicity == None:
+        if kind == "qp":
+            return exact_balanced_strategy(payoff)
+        return exact_optimal_strategy(payoff)
+    p = exact_simplex_strategy(payoff)
+    if kind == "qp":
+        return exact_active_set_balancing(payoff,p,multiplicity)
+    return p
+
+####################################################################################
+### Double-oracle solver (for games with very many strategies)
+####################################################################################
+
+"""
+The dense LP and QP above need O(m**2) memory and O(m**3) time, which is too
+much for games with thousands of strategies (e.g. races with many write-ins).
+But the optimal strategies of such games usually have small support, and the
+double-oracle method (column generation) only ever solves small subgames:
+   -- keep a restricted set S of strategies, and solve the game restricted to S,
+      giving a mixed strategy p on S;
+   -- compute (M p)_i for every strategy i (one pass over the margins of the
+      columns in S); the best response to p is the i maximizing it;
+   -- if max_i (M p)_i <= tolerance, p is optimal up to tolerance for the whole
+      game; otherwise add the best responses to S and repeat.
+For a symmetric game (antisymmetric M, value zero), max_i (M p)_i is how much
+any strategy gains against p, and the duality gap of p is twice that; both
+are certified by the final pass over all the strategies.
+
+For the balanced strategy, the method then balances on the set T of strategies
+i with (M p)_i >= -tolerance.  Only these can be in the support of an optimal
+strategy (if (M p)_i < 0 for an optimal p, then q_i = 0 for every optimal q), so
+the balanced strategy of the game restricted to T is the balanced strategy of
+the whole game; it is checked against the whole game like p.
+
+The tolerance is relative to the largest absolute payoff, and is never taken
+smaller than the accuracy of the subgame solver (twice the feastol of lp_options
+or qp_options), since gains below that are solver noise: an absolute tolerance
+mistakes that noise for best responses on scaled-up games, and may leave
+support strategies out of T.  The final strategy is checked by certify_strategy.
+
+When the optimal support is large after all, the subgames become nearly as big
+as the game and are solved many times over, so the method grows the number of
+best responses added per iteration with S (double_oracle_batch_growth times its
+size), and gives up and solves the whole game with the dense solver once S (or
+T) has more than double_oracle_dense_fraction of the strategies.  It also falls
+back to the dense solver if a restricted set S comes round again (the method
+would cycle), after double_oracle_max_iterations subgames, or if the final
+strategy fails certify_strategy.
+"""
+
+double_oracle_tolerance = 1e-7           # target for max_i (M p)_i, relative to the largest |payoff|
+double_oracle_batch = 5                  # least number of best responses added per iteration
+double_oracle_batch_growth = 0.25        # ... and at least this fraction of the size of S
+double_oracle_dense_fraction = 0.25      # solve the whole game densely once S is this large
+double_oracle_min_size = 1000            # "auto" uses the double oracle from this size on
+double_oracle_max_iterations = 100       # solve the whole game densely after this many subgames
+
+def double_oracle(payoff,kind="qp",tolerance=None,batch=None,backend=None):
+    """
+    Solve symmetric zero-sum game with given (antisymmetric) payoff matrix (list of
+    rows) by the double-oracle method.  kind is "qp" for the balanced optimal mixed
+    strategy, "lp" for some optimal mixed strategy.  Subgames are solved with the
+    given backend (default: chosen by select_backend for the subgame's size).
+    Return (x,gap,iterations), where x is the mixed strategy (a list), gap is its
+    certified duality gap 2 * max_i (M x)_i, and iterations is the number of
+    subgames solved.
+    """
+    if tolerance == None:
+        tolerance = double_oracle_tolerance
+    if batch == None:
+        batch = double_oracle_batch
+    m = len(payoff)
+    scale = float(max([ abs(pij) for row in payoff for pij in row ] + [ 0 ]))
+    if scale == 0.0:                             # every strategy is optimal
+        return ([ 1.0/m ] * m, 0.0, 0)
+    accuracy = 2 * max(lp_options['feastol'],(kind == "qp") * qp_options['feastol'])
+    relative_tolerance = max(tolerance,accuracy)
+    tolerance = relative_tolerance * scale
+    S = [ 0 ]
+    seen = set()
+    iterations = 0
+    dense = False
+    def subgame_solver(kind,size):
+        solver = select_backend(kind,size,backend)
+        if isinstance(solver,DoubleOracleBackend):
+            solver = solver_backends["cvxopt"]
+        return solver
+    def gains(S,p_S):
+        # (M p)_i for every strategy i, where p is p_S on S and zero elsewhere
+        terms = [ (j,pj) for (j,pj) in zip(S,p_S) if pj != 0.0 ]
+        return [ sum([ row[j]*pj for (j,pj) in terms ]) for row in payoff ]
+    def best_responses(S,g):
+        # strategies outside S gaining more than tolerance, best first
+        in_S = set(S)
+        candidates = sorted([ i for i in range(m) if i not in in_S and g[i] > tolerance ],
+                            key=lambda i: -g[i])
+        return candidates[:max(batch,int(double_oracle_batch_growth*len(S)))]
+    def dense_solve():
+        # the support is too large for the restricted games to pay off
+        if kind == "lp":
+            x = subgame_solver("lp",m).lp_solver(payoff)
+        else:
+            x = subgame_solver("qp",m).qp_solver(payoff)
+        return (range(m),x,gains(range(m),x))
+    while True:
+        if len(S) > double_oracle_dense_fraction * m or frozenset(S) in seen or \
+               iterations >= double_oracle_max_iterations:
+            iterations += 1
+            (S,p_S,g) = dense_solve()
+            dense = True
+            break
+        seen.add(frozenset(S))
+        iterations += 1
+        sub = [ [ payoff[i][j] for j in S ] for i in S ]
+        p_S = subgame_solver("lp",len(S)).lp_solver(sub)
+        g = gains(S,p_S)
+        new = best_responses(S,g)
+        if new != [ ]:
+            S = S + new
+            continue
+        # (any remaining gain above tolerance is within S: subgame solver accuracy)
+        if kind == "lp":
+            break
+        T = [ i for i in range(m) if g[i] >= -tolerance ]
+        iterations += 1
+        if len(T) > double_oracle_dense_fraction * m:
+            (S,p_S,g) = dense_solve()
+            dense = True
+            break
+        sub = [ [ payoff[i][j] for j in T ] for i in T ]
+        q_T = subgame_solver("qp",len(T)).qp_solver(sub)
+        g_q = gains(T,q_T)
+        new = best_responses(T,g_q)
+        if new == [ ]:
+            (S,p_S,g) = (T,q_T,g_q)
+            break
+        S = T + new
+    x = [ 0.0 ] * m
+    for (j,pj) in zip(S,p_S):
+        x[j] = float(pj)
+    if not dense and not certify_strategy(payoff,x,relative_tolerance)[0]:
+        iterations += 1
+        (S,x,g) = dense_solve()
+    return (x,2*max(max(g),0.0),iterations)
+
+####################################################################################
+### First-order solver (approximate strategies, anytime)
+####################################################################################
+
+"""
+When a strategy that is optimal to within a small tolerance will do (e.g. for
+dashboards or exploratory sweeps), a first-order method is much cheaper than the
+interior-point solvers for large games: each iteration is one matrix-vector
+product.  first_order_iterates runs optimistic multiplicative weights in self-play
+(for a symmetric game both players may use the same strategy):
+    y  <-  y + step * (2 g_t - g_(t-1)),   x_(t+1) = exp(y) / sum(exp(y)),
+where g_t = M x_t / scale is the payoff of each pure strategy against x_t, and
+scale is the largest absolute payoff.  The average of the x_t converges to an
+optimal strategy, and in practice the last x_t often does too.  Every
+check_interval iterations both are scored by their duality gap 2 * max_i (M x)_i
+(the same certificate as for double_oracle), and the better one is reported.
+The method stops when the gap is at most first_order_target_gap * scale, or
+after first_order_time_budget seconds or first_order_max_iterations iterations,
+whichever comes first.
+
+When the optimal strategy is unique (as it is for almost all elections) the
+result approximates the balanced strategy; otherwise it approximates *some*
+optimal strategy, as lp_solver does.  Every strategy gets positive probability,
+so supports should be read with a threshold well above the gap.
+"""
+
+first_order_target_gap = 1e-3           # target duality gap, relative to the largest |payoff|
+first_order_time_budget = 10.0          # seconds (None for no limit)
+first_order_max_iterations = 100000
+first_order_step = 2.0                  # step size, for payoffs scaled to [-1,1]
+first_order_check_interval = 10         # iterations between computations of the gap
+
+def first_order_iterates(payoff,target_gap=None,time_budget=None,check_interval=None):
+    """
+    Generate successively better approximate optimal mixed strategies for the
+    symmetric zero-sum game with given (antisymmetric) payoff matrix (list of rows),
+    by optimistic multiplicative weights.  Yields (x,gap,iterations,seconds) every
+    check_interval iterations, where x is the mixed strategy (a list), gap is its
+    duality gap 2 * max_i (M x)_i (in units of the payoff), iterations the number
+    of iterations done so far and seconds the time taken so far.  Stops after
+    yielding a strategy whose gap is at most target_gap times the largest absolute
+    payoff, or when the time budget or first_order_max_iterations is used up.
+    """
+    if target_gap == None:
+        target_gap = first_order_target_gap
+    if time_budget == None:
+        time_budget = first_order_time_budget
+    if check_interval == None:
+        check_interval = first_order_check_interval
+    start = time.time()
+    m = len(payoff)
+    scale = float(max([ abs(x) for row in payoff for x in row ] + [ 0 ]))
+    if scale == 0.0:                             # every strategy is optimal
+        yield ([ 1.0/m ] * m, 0.0, 0, time.time()-start)
+        return
+    M = matrix([ [ payoff[i][j]/scale for i in range(m) ] for j in range(m) ])
+    x = matrix(1.0/m, (m,1))
+    x_sum = matrix(0.0, (m,1))
+    y = matrix(0.0, (m,1))
+    g_previous = M * x
+    for t in range(1,first_order_max_iterations+1):
+        g = M * x
+        y = y + first_order_step * (2*g - g_previous)
+        g_previous = g
+        y = y - max(y)                           # keep exp(y) in range
+        w = exp(y)
+        x = w / sum(w)
+        x_sum = x_sum + x
+        seconds = time.time() - start
+        out_of_time = (time_budget != None and seconds >= time_budget)
+        if t % check_interval == 0 or out_of_time or t == first_order_max_iterations:
+            x_average = x_sum / t
+            gap_average = 2 * max(max(M * x_average), 0.0)
+            gap_last = 2 * max(max(M * x), 0.0)
+            if gap_last < gap_average:
+                (best,gap) = (x,gap_last)
+            else:
+                (best,gap) = (x_average,gap_average)
+            yield (list(best), gap*scale, t, seconds)
+            if gap <= target_gap or out_of_time:
+                return
+
+def first_order_solve(payoff,target_gap=None,time_budget=None):
+    """
+    Return (x,gap,iterations): the last strategy generated by first_order_iterates,
+    with its duality gap and the number of iterations taken.
+    """
+    for (x,gap,iterations,seconds) in first_order_iterates(payoff,target_gap,time_budget):
+        pass
+    return (x,gap,iterations)
+
+####################################################################################
+### Solver backends
+####################################################################################
+
+"""
+A solver backend is an object with methods
+    lp_solver(payoff)  -- returns *some* optimal mixed strategy
+    qp_solver(payoff)  -- returns the *balanced* optimal mixed strategy
+                          (the optimal mixed strategy minimizing sum of squares)
+with the same conventions as the functions lp_solver and qp_solver above.
+Every backend returns a list of probabilities, with slightly negative values
+rounded up to zero and the result normalized to sum to one.  (The balanced
+strategy is unique, so all backends agree on it up to solver tolerance; the LP
+may return different optimal strategies when the optimum is not unique.)
+
+Backends are registered by name in solver_backends.  The backend used by
+solve_game is given by its backend argument, or else by the module setting
+solver_backend, which may name a backend or be "auto".  With "auto", LPs go
+to SciPy's HiGHS dual simplex when it is available and the game has at most
+scipy_lp_max_size strategies (simplex is much faster than an interior-point
+method on small dense games), and everything else goes to CVXOPT -- except
+that games with at most exact_max_size strategies are solved exactly by
+support enumeration (ExactBackend), which is faster there and has no
+tolerances, and games with at least double_oracle_min_size strategies are
+solved by the double-oracle method (DoubleOracleBackend), which never builds
+the dense m x m problem.  The approximate first-order solver (FirstOrderBackend)
+and the structured QP formulation (StructuredCvxoptBackend, which is no faster
+than qp_solver) are only used when asked for by name.
+"""
+
+class CvxoptBackend(object):
+    """
+    Backend using the CVXOPT interior-point solvers (lp_solver and qp_solver above).
+    """
+    name = "cvxopt"
+
+    def lp_solver(self,payoff):
+        return lp_solver(payoff)
+
+    def qp_solver(self,payoff):
+        return qp_solver(payoff)
+
+class StructuredCvxoptBackend(object):
+    """
+    Backend using CVXOPT with the structured QP formulation (structured_qp_solver
+    above) for the balanced strategy, and lp_solver for the LP.
+    """
+    name = "cvxopt structured"
+
+    def lp_solver(self,payoff):
+        return lp_solver(payoff)
+
+    def qp_solver(self,payoff):
+        return structured_qp_solver(payoff)
+
+class ScipyBackend(object):
+    """
+    Backend using scipy.optimize (requires SciPy).
+
+    The LP  minimize u  subject to  payoff p <= u, sum(p) = 1, p >= 0
+    is solved by linprog, using the HiGHS solver when SciPy has it (SciPy >= 1.6),
+    and otherwise its interior-point method.
+    The balanced strategy is then found by minimizing sum of squares of p subject to
+    payoff p <= u, sum(p) = 1, p >= 0, using SLSQP started from the LP solution.
+    Here u is the game value: exactly 0 when payoff is antisymmetric (as margin
+    matrices are), and otherwise the value found by the LP.
+    """
+    name = "scipy"
+
+    def __init__(self):
+        self.lp_method = None                       # determined on first use
+
+    def available(self):
+        return scipy != None
+
+    def has_highs(self):
+        if self.lp_method == None:
+            version = tuple([ int(part) for part in scipy.__version__.split(".")[:2] ])
+            if version >= (1,6):
+                self.lp_method = "highs"
+            else:
+                self.lp_method = "interior-point"
+        return self.lp_method == "highs"
+
+    def solve_lp(self,payoff):
+        """
+        Return (p,u): an optimal mixed strategy p (numpy array) and the game value u.
+        """
+        self.has_highs()
+        M = numpy.array(payoff,dtype=float)
+        m = len(M)
+        c = numpy.zeros(m+1)
+        c[m] = 1.0                                  # minimize u
+        A_ub = numpy.hstack([M,-numpy.ones((m,1))]) # payoff p - u <= 0
+        b_ub = numpy.zeros(m)
+        A_eq = numpy.hstack([numpy.ones((1,m)),numpy.zeros((1,1))])
+        b_eq = [ 1.0 ]
+        bounds = [ (0,None) ]*m + [ (None,None) ]
+        if self.lp_method == "highs":
+            options = { }
+        else:
+            options = { "tol": 1e-10 }
+        result = scipy.optimize.linprog(c,A_ub=A_ub,b_ub=b_ub,A_eq=A_eq,b_eq=b_eq,
+                                        bounds=bounds,method=self.lp_method,options=options)
+        if result.status != 0 or result.x is None:
+            raise ValueError("linprog failed: %s"%result.message)
+        u = result.x[m]
+        if (M == -M.T).all():
+            u = 0.0                                 # symmetric game has value zero
+        return (result.x[:m],u)
+
+    def lp_solver(self,payoff):
+        (p,u) = self.solve_lp(payoff)
+        return normalized_strategy(p)
+
+    def qp_solver(self,payoff):
+        (p,u) = self.solve_lp(payoff)
+        M = numpy.array(payoff,dtype=float)
+        m = len(M)
+        scale = max(1.0,abs(M).max())               # keep constraint values of order one
+        M = M / scale
+        u = u / scale
+        constraints = [ { "type": "ineq", "fun": lambda x: u - M.dot(x), "jac": lambda x: -M },
+                        { "type": "eq", "fun": lambda x: x.sum() - 1.0,
+                          "jac": lambda x: numpy.ones((1,m)) } ]
+        result = scipy.optimize.minimize(lambda x: x.dot(x), numpy.maximum(p,0.0),
+                                         jac=lambda x: 2.0*x, method="SLSQP",
+                                         bounds=[ (0.0,1.0) ]*m, constraints=constraints,
+                                         options={ "ftol": 1e-14, "maxiter": 1000 })
+        if not result.success:
+            raise ValueError("SLSQP failed: %s"%result.message)
+        return normalized_strategy(result.x)
+
+class ExactBackend(object):
+    """
+    Backend using the exact solvers (see exact_solve_game above), converting their
+    results to floats; only for symmetric games (antisymmetric payoff matrices).
+    Other games are passed on to the CVXOPT solvers.
+    """
+    name = "exact"
+
+    def lp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return lp_solver(payoff)
+        return [ float(pi) for pi in exact_solve_game(payoff,"lp") ]
+
+    def qp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return qp_solver(payoff)
+        return [ float(pi) for pi in exact_solve_game(payoff,"qp") ]
+
+class DoubleOracleBackend(object):
+    """
+    Backend using the double-oracle method (see double_oracle above); only for
+    symmetric games (antisymmetric payoff matrices).  Other games are passed on to
+    the CVXOPT solvers.
+    """
+    name = "double oracle"
+
+    def lp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return lp_solver(payoff)
+        return double_oracle(payoff,"lp")[0]
+
+    def qp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return qp_solver(payoff)
+        return double_oracle(payoff,"qp")[0]
+
+class FirstOrderBackend(object):
+    """
+    Backend using the first-order solver (see first_order_iterates above); only
+    for symmetric games (antisymmetric payoff matrices).  Other games are passed on
+    to the CVXOPT solvers.  Its strategies are only optimal to within
+    first_order_target_gap, so "auto" never selects it.
+    """
+    name = "first order"
+
+    def lp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return lp_solver(payoff)
+        return first_order_solve(payoff)[0]
+
+    def qp_solver(self,payoff):
+        if not is_antisymmetric(payoff):
+            return qp_solver(payoff)
+        return first_order_solve(payoff)[0]
+
+solver_backends = { "cvxopt": CvxoptBackend(), "cvxopt structured": StructuredCvxoptBackend(),
+                    "exact": ExactBackend(),
+                    "double oracle": DoubleOracleBackend(), "first order": FirstOrderBackend() }
+if scipy != None:
+    solver_backends["scipy"] = ScipyBackend()
+
+solver_backend = "auto"                  # name of backend to use, or "auto"
+scipy_lp_max_size = 200                  # "auto" uses HiGHS LP up to this many strategies
+exact_max_size = 6                       # "auto" uses exact support enumeration up to this size
+
+def select_backend(kind,m,backend=None):
+    """
+    Return the backend object to use for a solve of the given kind ("lp" or "qp")
+    of a game with m strategies.  backend is a backend name, "auto", or None
+    (meaning use the setting solver_backend).
+    """
+    if backend == None:
+        backend = solver_backend
+    if backend == "scipy" and "scipy" not in solver_backends:
+        raise ValueError("solver backend `scipy' needs SciPy, which is not installed")
+    if backend != "auto":
+        if backend not in solver_backends:
+            raise ValueError("unknown solver backend `%s'"%backend)
+        return solver_backends[backend]
+    if m <= exact_max_size:
+        return solver_backends["exact"]
+    if m >= double_oracle_min_size:
+        return solver_backends["double oracle"]
+    if kind == "lp" and m <= scipy_lp_max_size and "scipy" in solver_backends \
+            and solver_backends["scipy"].has_highs():
+        return solver_backends["scipy"]
+    return solver_backends["cvxopt"]
+
+def solve_game(payoff,kind="qp",backend=None):
+    """
+    Solve game with given payoff matrix, using the selected backend.
+    kind is "qp" for the balanced optimal mixed strategy, "lp" for some optimal mixed strategy.
+    """
+    solver = select_backend(kind,len(payoff),backend)
+    if kind == "qp":
+        return solver.qp_solver(payoff)
+    return solver.lp_solver(payoff)
+
+####################################################################################
+### Isolated solver worker pool (timeouts and fallbacks)
+####################################################################################
+
+"""
+A bad payoff matrix can make the CVXOPT QP run for a long time or fail, which
+would stall or kill a long batch of solves.  A SolverPool runs solves in a pool
+of persistent worker processes, waiting at most timeout seconds for each.  If a
+solve of the balanced strategy times out or fails, it falls back along the chain
+    "solve"        -- solve_game in a worker (the usual backend choice)
+    "lp balanced"  -- lp_balanced_strategy in a worker: an LP solve, then exact
+                      balancing (exact_solve_game, no QP) of the game on the
+                      strategies that can be in an optimal support, checked by
+                      certify_strategy
+    "exact"        -- exact_solve_game in a worker, for symmetric games with
+                      at most pool_exact_max_size strategies
+    "first order"  -- first_order_solve in this process (approximate, but it
+                      always stops within first_order_time_budget seconds)
+(for some optimal strategy, kind "lp", the chain is "solve", "exact", "first
+order").  SolverPool.solve returns the answer with the name of the path that
+produced it, and counts the paths used in its stats.  Every step but the
+last runs in a worker under the timeout, so a solve takes at most about three
+timeouts plus first_order_time_budget.
+
+A worker that times out cannot be stopped alone, so the whole pool is then
+terminated and a new one started on the next solve; solves that other threads
+had waiting in the old pool time out and fall back as well.  Workers are forked
+when the pool starts, so they see the module settings as they were then.  Pools
+cannot be used from within daemonic worker processes (e.g. those of
+vs.compare_methods with executor="processes").
+"""
+
+pool_timeout = 10.0                     # seconds to wait for each solve in a worker
+pool_exact_max_size = 40                # largest game for the exact fallback
+
+def lp_balanced_strategy(payoff,tolerance=1e-7):
+    """
+    Return the balanced optimal mixed strategy for the symmetric game with given
+    (antisymmetric) payoff matrix, computed as an LP solution p followed by exact
+    balancing of the game restricted to the strategies i with (M p)_i >= -tolerance
+    (only these can be in the support of an optimal strategy); raise ValueError if
+    the result is not certified optimal.
+    """
+    m = len(payoff)
+    scale = float(max([ abs(pij) for row in payoff for pij in row ] + [ 1 ]))
+    p = lp_solver(payoff)
+    T = [ i for i in range(m)
+          if sum([ payoff[i][j]*p[j] for j in range(m) ]) >= -tolerance * scale ]
+    x_T = exact_solve_game([ [ payoff[i][j] for j in T ] for i in T ],"qp")
+    x = [ 0.0 ] * m
+    for (i,xi) in zip(T,x_T):
+        x[i] = float(xi)
+    if not certify_strategy(payoff,x)[0]:
+        raise ValueError("balanced LP solution is not optimal")
+    return x
+
+def pool_task(task,payoff,kind):
+    """
+    Run task ("solve", "lp balanced" or "exact") for a worker of a SolverPool.
+    """
+    if task == "solve":
+        return solve_game(payoff,kind)
+    if task == "exact":
+        return [ float(xi) for xi in exact_solve_game(payoff,kind) ]
+    return lp_balanced_strategy(payoff)
+
+class SolverPool(object):
+    """
+    Pool of worker processes for solving games with timeouts and fallbacks (see above).
+    """
+
+    def __init__(self,workers=None,timeout=None):
+        self.workers = workers                   # default: number of CPUs
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pool = None
+        self.stats = { "solve": 0, "lp balanced": 0, "exact": 0, "first order": 0,
+                       "timeouts": 0, "failures": 0, "restarts": 0 }
+
+    def count(self,name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def run(self,task,payoff,kind):
+        """
+        Return the result of pool_task(task,payoff,kind) from a worker, or None if it
+        fails or times out.
+        """
+        with self.lock:
+            if self.pool == None:
+                self.pool = multiprocessing.Pool(self.workers)
+            pool = self.pool
+        timeout = self.timeout
+        if timeout == None:
+            timeout = pool_timeout
+        try:
+            return pool.apply_async(pool_task,(task,payoff,kind)).get(timeout)
+        except multiprocessing.TimeoutError:
+            self.count("timeouts")
+            with self.lock:
+                if self.pool is pool:            # (not already replaced by another thread)
+                    pool.terminate()
+                    self.pool = None
+                    self.stats["restarts"] += 1
+        except Exception:
+            self.count("failures")
+        return None
+
+    def solve(self,payoff,kind="qp"):
+        """
+        Return (x,path): the solution of the given kind ("qp" or "lp") for the game
+        with given payoff matrix, and the name of the path of the fallback chain
+        that produced it.
+        """
+        x = self.run("solve",payoff,kind)
+        path = "solve"
+        symmetric = is_antisymmetric(payoff)
+        if x == None and symmetric and kind == "qp":
+            x = self.run("lp balanced",payoff,kind)
+            path = "lp balanced"
+        if x == None and symmetric and len(payoff) <= pool_exact_max_size:
+            x = self.run("exact",payoff,kind)
+            path = "exact"
+        if x == None and symmetric:
+            x = first_order_solve(payoff)[0]
+            path = "first order"
+        if x == None:
+            raise ValueError("no solver in the fallback chain succeeded")
+        self.count(path)
+        return (x,path)
+
+    def close(self):
+        with self.lock:
+            if self.pool != None:
+                self.pool.terminate()
+                self.pool = None
+
+####################################################################################
+### Batched solves (many games at once)
+####################################################################################
+
+"""
+Simulations and per-precinct tallies produce thousands of small games.
+solve_games solves a whole batch: each game is answered by the first of
+    "condorcet" -- in a symmetric game, a strategy beating all others is the
+                   unique solution (condorcet_index; O(m**2))
+    "exact"     -- games with at most exact_max_size strategies are solved exactly
+    "cvxopt"    -- a GameSolver for the game's size, which builds the parts of the
+                   CVXOPT problem that depend only on m once for all games of that
+                   size (cold starts)
+that applies.  With workers > 1 the batch is split into chunks that are solved
+in a pool of that many processes (each with its own GameSolvers).  The counts
+of each path, the time taken and the throughput in games per second are left in
+batch_stats.
+
+A small game takes about 2 ms, comparable to pickling it and its answer, so a
+pool only pays when each worker gets a large chunk and a CPU of its own.  So the
+default is serial; the workers are capped at the number of CPUs, and chunks have
+at least batch_min_chunk_size games (a batch too small for two such chunks is
+solved serially).  On one CPU, 2000 games with 12-25 candidates ran at 491
+games per second serially and 430-462 with workers=4 before this cap.
+"""
+
+batch_chunks_per_worker = 2             # chunks per worker process, for load balancing
+batch_min_chunk_size = 500              # fewest games in a chunk sent to a worker
+batch_stats = { }
+
+def condorcet_index(M):
+    """
+    Return the index i with M[i][j] > 0 for all j != i (the Condorcet winner, for
+    margin matrix M, a list of rows), or None.  For a symmetric game (antisymmetric
+    M) the pure strategy on i is then the unique optimal strategy.
+    """
+    m = len(M)
+    i = 0
+    for j in range(1,m):                 # only the last candidate not yet beaten can win
+        if M[i][j] <= 0:
+            i = j
+    if all([ M[i][j] > 0 for j in range(m) if j != i ]):
+        return i
+    return None
+
+def solve_games_chunk(job):
+    """
+    Solve the games of one chunk of a batch; job is (payoffs,kind).
+    Return (strategies,counts), where counts gives the number of games answered by each path.
+    """
+    (payoffs,kind) = job
+    solvers_by_size = { }
+    counts = { "condorcet": 0, "exact": 0, "cvxopt": 0 }
+    strategies = [ ]
+    for payoff in payoffs:
+        m = len(payoff)
+        symmetric = is_antisymmetric(payoff)
+        i = None
+        if symmetric:
+            i = condorcet_index(payoff)
+        if i != None:
+            x = [ 0.0 ] * m
+            x[i] = 1.0
+            counts["condorcet"] += 1
+        elif m <= exact_max_size and symmetric:
+            x = [ float(xi) for xi in exact_solve_game(payoff,kind) ]
+            counts["exact"] += 1
+        else:
+            if m not in solvers_by_size:
+                solvers_by_size[m] = GameSolver(m,warm_start=())
+            solver = solvers_by_size[m]
+            if kind == "lp":
+                x = solver.lp_solver(payoff)
+            else:
+                x = solver.qp_solver(payoff)
+            counts["cvxopt"] += 1
+        strategies.append(x)
+    return (strategies,counts)
+
+def solve_games(payoffs,kind="qp",workers=1):
+    """
+    Return the list of solutions of the given kind ("qp" for the balanced optimal
+    mixed strategy, "lp" for some optimal mixed strategy) of the games with the
+    given payoff matrices (a list of lists of rows, or a 3-dimensional numpy array),
+    using workers processes (None: one per CPU).  See above.
+    """
+    start = time.time()
+    if hasattr(payoffs,"tolist"):
+        payoffs = payoffs.tolist()
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, multiprocessing.cpu_count())
+    n = min(workers * batch_chunks_per_worker, len(payoffs) // batch_min_chunk_size)
+    if workers <= 1 or n <= 1:
+        results = [ solve_games_chunk((payoffs,kind)) ]
+    else:
+        workers = min(workers, n)
+        bounds = [ (k * len(payoffs)) // n for k in range(n+1) ]
+        jobs = [ (payoffs[bounds[k]:bounds[k+1]],kind) for k in range(n) ]
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(solve_games_chunk,jobs)
+        finally:
+            pool.close()
+    strategies = [ ]
+    counts = { "condorcet": 0, "exact": 0, "cvxopt": 0 }
+    for (chunk_strategies,chunk_counts) in results:
+        strategies.extend(chunk_strategies)
+        for path in chunk_counts:
+            counts[path] += chunk_counts[path]
+    seconds = time.time() - start
+    batch_stats.clear()
+    batch_stats.update(counts)
+    batch_stats["games"] = len(payoffs)
+    batch_stats["seconds"] = seconds
+    batch_stats["games per second"] = len(payoffs) / max(seconds,1e-9)
+    return strategies
+
+####################################################################################
+### Parametric paths (sensitivity of the balanced strategy)
+####################################################################################
+
+"""
+parametric_path traces the balanced strategy x(t) of the symmetric game with
+payoff matrix M + t D, for t from t_start to t_end, where D is an antisymmetric
+direction (e.g. the margins of one ballot, so that t is a change in the count of
+a group of ballots).  While the support F and the tight rows R stay the same,
+x(t) is the solution of the active-set linear system of polish_strategy for
+M + t D, a rational function of t; so the path is piecewise rational, with
+breakpoints where F or R changes.  Instead of solving a QP at every sample t,
+each piece costs one QP solve (polished_qp_solver) at its start, to find its
+active set, plus a few linear solves (solve_active_set) checking whether that
+active set is still certified optimal at later t: at parametric_checks evenly
+spaced points up to t_end and at every tie value in between, then by bisection
+down to parametric_t_tolerance (relative to t_end - t_start) between the last
+point where it holds and the first where it fails.
+
+The tie values are the t at which some entry of M + t D with D_ij != 0 is zero.
+There the game is degenerate, and its balanced strategy may differ from those
+on both sides (e.g. when two candidates tie, the balanced strategy can jump to
+an even split between them just at the tie).  For ballot counts the tie values
+are integers, which are exactly the values of interest; so a breakpoint that
+bisection puts at a tie value is taken to be exactly there, and the tie value
+gets a piece of its own (with "from" == "to").  Other breakpoints are only known
+to lie between one piece's "to" and the next piece's "from".
+
+If the solution at the start of a piece cannot be certified (polishing fails,
+e.g. in games with many ties), the piece is marked uncertified and covers
+parametric_fallback_step (relative) of the range.  parametric_strategy answers
+for any t by one linear solve with the piece(s) around t, and falls back to a
+direct solve where none of them certifies its answer (between pieces, or on
+uncertified pieces); so it never returns an uncertified strategy.  Degenerate
+games are where the QP is least accurate (errors of 1e-4 at tie values are
+common), so the direct solves, and the strategies of uncertified pieces, use
+exact_solve_game for games with at most parametric_exact_max_size strategies.
+"""
+
+parametric_checks = 8
+parametric_t_tolerance = 1e-6
+parametric_fallback_step = 0.01
+parametric_exact_max_size = 12
+parametric_stats = { }
+
+def parametric_direct_solve(P):
+    """
+    Return the balanced strategy (a list) of payoff matrix P (list of rows), exactly
+    if it is small enough (see above).
+    """
+    if len(P) <= parametric_exact_max_size:
+        return [ float(xi) for xi in exact_solve_game(P,"qp") ]
+    return polished_qp_solver(P)
+
+def parametric_game(payoff,direction,t):
+    """
+    Return the payoff matrix payoff + t * direction (a list of rows), and the same
+    scaled to entries in [-1,1] as a cvxopt matrix.
+    """
+    m = len(payoff)
+    P = [ [ payoff[i][j] + t * direction[i][j] for j in range(m) ] for i in range(m) ]
+    scale = float(max([ abs(pij) for row in P for pij in row ] + [ 0 ]))
+    if scale == 0.0:
+        scale = 1.0
+    return (P,matrix(P).trans() / scale)
+
+def tie_values(payoff,direction,t_start,t_end):
+    """
+    Return the sorted list of t in [t_start,t_end] at which some entry of
+    payoff + t * direction changes sign.
+    """
+    m = len(payoff)
+    ties = set()
+    for i in range(m):
+        for j in range(i+1,m):
+            if direction[i][j] != 0:
+                t = -float(payoff[i][j]) / direction[i][j]
+                if t_start <= t <= t_end:
+                    ties.add(t)
+    return sorted(ties)
+
+def parametric_path(payoff,direction,t_start,t_end):
+    """
+    Return the pieces of the path of balanced strategies of payoff + t * direction
+    (both antisymmetric matrices, as lists of rows) for t_start <= t <= t_end (see
+    above), in order of t.  Each piece is a dict with keys
+        "from", "to"  -- its range of t
+        "support"     -- list of the strategies with positive probability
+        "tight"       -- list of the strategies i with (M x)_i = 0
+        "drop"        -- the row left out of the linear system (see solve_active_set)
+        "x"           -- the balanced strategy at "from" (or just after, if "from"
+                         is a tie value ending the previous piece)
+        "certified"   -- True if the active set was certified
+    The numbers of QP, direct and linear solves used are left in parametric_stats.
+    """
+    m = len(payoff)
+    counts = { "qp solves": 0, "direct solves": 0, "linear solves": 0 }
+
+    def valid(t,piece):
+        counts["linear solves"] += 1
+        return solve_active_set(parametric_game(payoff,direction,t)[1],piece["support"],
+                                piece["tight"],piece["drop"],polish_tolerance) != None
+
+    def piece_at(t,x):
+        g = parametric_game(payoff,direction,t)[1] * matrix(x)
+        F = [ i for i in range(m) if x[i] > polish_threshold ]
+        R = [ i for i in range(m) if g[i] >= -polish_threshold ]
+        piece = { "from": t, "to": t, "support": F, "tight": R, "x": x,
+                  "drop": max(F,key=lambda i: x[i]) }
+        piece["certified"] = valid(t,piece)
+        return piece
+
+    def active_set(t):
+        counts["qp solves"] += 1
+        try:
+            return piece_at(t,polished_qp_solver(parametric_game(payoff,direction,t)[0]))
+        except (ValueError,ArithmeticError):     # CVXOPT can break down near a tie value
+            return direct_active_set(t)
+
+    def direct_active_set(t):
+        # the active set of the direct solution; the strategy is kept even if the
+        # active set cannot be certified
+        counts["direct solves"] += 1
+        return piece_at(t,parametric_direct_solve(parametric_game(payoff,direction,t)[0]))
+
+    ties = tie_values(payoff,direction,t_start,t_end)
+    pieces = [ ]
+    t = t_start
+    t_tolerance = parametric_t_tolerance * (t_end - t_start)
+    fallback_step = parametric_fallback_step * (t_end - t_start)
+    while True:
+        if t in ties:
+            piece = active_set(t)                # the tie value on its own
+            if not piece["certified"]:
+                piece = direct_active_set(t)
+            pieces.append(piece)
+            if t >= t_end:
+                break
+        # just after a breakpoint the solution is nearly degenerate (a probability or
+        # an entry of M x is only just leaving zero), so its active set may not be
+        # recognized there; then look for it a little further on
+        starts = [ t + 10**k * t_tolerance for k in range(1,20)
+                   if 10**k * t_tolerance < min(fallback_step,t_end - t) ]
+        if t not in ties:
+            starts = [ t ] + starts
+        if starts == [ ]:
+            starts = [ (t + t_end) / 2.0 ]
+        if pieces != [ ] and not pieces[-1]["certified"]:
+            starts = starts[:1]                  # not just after a breakpoint
+        for start in starts:
+            piece = active_set(start)
+            if piece["certified"]:
+                break
+        if not piece["certified"]:
+            piece = direct_active_set(start)
+        piece["from"] = t
+        if not piece["certified"]:
+            (lo,hi) = (min(t_end,t + fallback_step),None)
+        else:
+            (lo,hi) = (start,None)
+            checks = [ start + (t_end - start) * k / float(parametric_checks)
+                       for k in range(1,parametric_checks+1) ]
+            for s in sorted(set(checks + [ z for z in ties if z > start ])):
+                if not valid(s,piece):
+                    hi = s
+                    break
+                lo = s
+            if hi != None:
+                while hi - lo > t_tolerance:
+                    mid = (lo + hi) / 2.0
+                    if valid(mid,piece):
+                        lo = mid
+                    else:
+                        hi = mid
+                if hi in ties and hi - lo <= t_tolerance:
+                    lo = hi                      # the breakpoint is the tie value
+        piece["to"] = lo
+        pieces.append(piece)
+        if hi in ties:
+            t = hi                               # next, the tie value on its own
+        elif lo >= t_end:
+            break
+        elif hi == None:
+            t = lo
+        else:
+            t = hi
+    parametric_stats.clear()
+    parametric_stats.update(counts)
+    return pieces
+
+def parametric_strategy(payoff,direction,pieces,t):
+    """
+    Return the balanced strategy (a list) of payoff + t * direction, for t in the
+    range of pieces (from parametric_path): by one linear solve with a certified piece
+    at or next to t, or else directly (see parametric_direct_solve).
+    """
+    tolerance = parametric_t_tolerance * (pieces[-1]["to"] - pieces[0]["from"])
+    near = [ piece for piece in pieces if piece["from"] - tolerance <= t <= piece["to"] + tolerance ]
+    near.sort(key=lambda piece: piece["to"] - piece["from"])   # tie values first
+    (P,M) = parametric_game(payoff,direction,t)
+    for piece in near:
+        if piece["certified"]:
+            x = solve_active_set(M,piece["support"],piece["tight"],piece["drop"],polish_tolerance)
+            if x != None:
+                return normalized_strategy(x)
+    return parametric_direct_solve(P)
+
 def qp_solver_test():
     """
     One test example that produced a singular KKT error when options were set differently.
@@ -38,11 +38,16 @@
 ** (end of license)
 """
 
+import fractions
+import hashlib
 import math
+import multiprocessing
+import multiprocessing.pool
 import os
 import random
 import string
 import sys
+import threading
 
 import game_cvxopt                  # LP and QP solvers for two-person zero-sum games
 
@@ -474,16 +479,237 @@ def filter_profile(P,A):
 ### RANDOM PROFILE GENERATOR
 ########################################################################################
 
-def random_hypersphere_point(d):
+"""
+All random choices in this code are made through an explicit random number
+generator rng, a random.Random object, rather than through the global random module.
+Simulations derive one independent stream per trial (and per purpose) from a
+single root seed using rng_stream, so that the random numbers a trial sees do not
+depend on what other trials did, or on whether trials run serially, in threads, or
+in separate processes.
+"""
+
+def make_rng(seed):
+    """
+    Return a random number generator for seed, which is either an integer
+    (or other hashable seed value), or already a random.Random object.
     """
-    Return a random point on a d-dimensional hypersphere.
+    if isinstance(seed,random.Random):
+        return seed
+    return random.Random(seed)
+
+def rng_stream(root_seed,*labels):
+    """
+    Return a new random.Random generator for the stream named by labels
+    (e.g. a trial number and a purpose such as "profile") under root_seed.
+    The generator's seed is a SHA-256 hash of the root seed and the labels, so
+    the same root seed and labels always give the same stream, in any thread
+    or process, and distinct labels give (effectively) independent streams.
+    Labels should be integers or strings.
+
+    Example:
+        rng_stream(1,17,"lottery")   -- stream for GT lottery of trial 17 under root seed 1
+    """
+    key = repr((root_seed,)+tuple(labels))
+    return random.Random(long(hashlib.sha256(key).hexdigest(),16))
+
+def random_hypersphere_point(d,rng):
+    """
+    Return a random point on a d-dimensional hypersphere, using random number generator rng.
     Ref: http://mathworld.wolfram.com/HyperspherePointPicking.html
     """
-    x = [ random.gauss(0.0,1.0) for i in range(d) ]
+    x = [ rng.gauss(0.0,1.0) for i in range(d) ]
     l = math.sqrt(sum([xi**2 for xi in x]))
     x = [ xi / l for xi in x]
     return x
 
+def random_binomial(n,p,rng):
+    """
+    Return a random binomially distributed integer: the number of successes
+    in n independent trials that each succeed with probability p,
+    using random number generator rng.
+
+    Uses inversion when the mean n*min(p,1-p) is small, and otherwise
+    Hormann's BTRS (transformed rejection with squeeze) method, so that
+    the expected running time is O(1) rather than O(n).
+    Ref: W. Hormann, "The generation of binomial random variates",
+         J. Statist. Comput. Simul. 46 (1993), 101--110.
+    """
+    if n <= 0 or p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - random_binomial(n,1.0-p,rng)
+    if n*p < 10.0:
+        # inversion: walk up the cumulative distribution
+        q = 1.0 - p
+        s = p / q
+        a = (n+1) * s
+        r = q**n
+        u = rng.random()
+        x = 0
+        while u > r and x < n:
+            u -= r
+            x += 1
+            r *= a/x - s
+        return x
+    # BTRS
+    spq = math.sqrt(n*p*(1.0-p))
+    b = 1.15 + 2.53*spq
+    a = -0.0873 + 0.0248*b + 0.01*p
+    c = n*p + 0.5
+    v_r = 0.92 - 4.2/b
+    alpha = (2.83 + 5.1/b)*spq
+    lpq = math.log(p/(1.0-p))
+    mode = int(math.floor((n+1)*p))
+    h = math.lgamma(mode+1) + math.lgamma(n-mode+1)
+    while True:
+        u = rng.random() - 0.5
+        v = rng.random()
+        us = 0.5 - abs(u)
+        if us == 0.0 or v == 0.0:
+            continue
+        k = int(math.floor((2.0*a/us + b)*u + c))
+        if k < 0 or k > n:
+            continue
+        if us >= 0.07 and v <= v_r:
+            return k
+        v = math.log(v*alpha/(a/(us*us)+b))
+        if v <= h - math.lgamma(k+1) - math.lgamma(n-k+1) + (k-mode)*lpq:
+            return k
+
+def random_multinomial(n,weights,rng):
+    """
+    Return a list of counts, one per cell, for n items thrown independently
+    into cells with probabilities proportional to the given (positive) weights,
+    using random number generator rng.
+    Done by a sequence of conditional binomial draws, so running time is
+    proportional to the number of cells, not to n.
+    """
+    k = len(weights)
+    tails = [ 0.0 ] * (k+1)              # tails[i] = sum(weights[i:])
+    for i in range(k-1,-1,-1):
+        tails[i] = tails[i+1] + weights[i]
+    counts = [ 0 ] * k
+    for i in range(k-1):
+        if n == 0:
+            break
+        counts[i] = random_binomial(n,weights[i]/tails[i],rng)
+        n -= counts[i]
+    if k > 0:
+        counts[k-1] += n                 # last cell takes whatever is left
+    return counts
+
+def number_of_perms(m,r):
+    """
+    Return the number of r-permutations of m items, i.e. m!/(m-r)!
+    (This is len(perms(A,r)) when len(A)==m.)
+    """
+    ans = 1
+    for i in range(m-r+1,m+1):
+        ans *= i
+    return ans
+
+"""
+Uniform profiles with few candidates are generated at the level of ballot
+counts rather than voter by voter: the profile is then just a multinomial
+draw over the possible ballots (the cells).  This is done whenever the number of
+cells is at most max_multinomial_cells; otherwise ballots are generated one voter
+at a time.
+"""
+max_multinomial_cells = 5040                 # 7!
+
+def uniform_profile_counts(A,ballot_count,lengths,rng):
+    """
+    Return a random profile for the uniform distribution, drawn directly
+    as ballot counts.  Each ballot first gets a length chosen uniformly
+    from the list lengths, and then a uniformly chosen ballot of that length;
+    this is the same distribution as shuffling and then truncating each ballot.
+    Running time is proportional to the number of possible ballots, and
+    essentially independent of ballot_count.
+    """
+    P = { }
+    length_counts = random_multinomial(ballot_count,[1.0]*len(lengths),rng)
+    for (r,count) in zip(lengths,length_counts):
+        if count == 0:
+            continue
+        ballots = perms(A,r)
+        for (ballot,cnt) in zip(ballots,random_multinomial(count,[1.0]*len(ballots),rng)):
+            if cnt > 0:
+                P[ballot] = cnt
+    return P
+
+def truncate_profile_counts(P,length_range,rng):
+    """
+    Return the profile obtained from profile P (of full ballots) by truncating
+    each ballot to a length chosen uniformly from length_range, independently
+    for each voter.  Works on ballot counts: the count of each ballot is split
+    among the allowed lengths by one multinomial draw.
+    """
+    if length_range == None:
+        return P
+    lengths = range(length_range[0],length_range[1]+1)
+    Pnew = { }
+    for ballot in sorted(P):
+        for (r,cnt) in zip(lengths,random_multinomial(P[ballot],[1.0]*len(lengths),rng)):
+            if cnt > 0:
+                prefix = tuple(ballot[:r])
+                Pnew[prefix] = Pnew.get(prefix,0) + cnt
+    return Pnew
+
+def mallows_profile_counts(A,ballot_count,phi,reference,rng):
+    """
+    Return a random profile of full ballots from the Mallows model with
+    dispersion phi (0 <= phi <= 1) around the ranking reference: a ballot
+    at Kendall-tau distance k from reference has probability proportional to phi**k.
+    (phi = 0 gives only the reference ranking; phi = 1 gives the uniform distribution.)
+
+    Uses the repeated insertion model: the i-th candidate of reference is
+    inserted into the partial ranking at position j (0 = top) with probability
+    proportional to phi**(i-j), independently of the earlier insertions.
+    The voters are carried along in groups sharing a partial ranking, and each
+    group is split among the insertion positions by one multinomial draw, so
+    running time depends on the number of distinct ballots, not on ballot_count.
+    """
+    groups = { tuple(): ballot_count }
+    for (i,a) in enumerate(reference):
+        weights = [ phi**(i-j) for j in range(i+1) ]
+        new_groups = { }
+        for partial in sorted(groups):
+            counts = random_multinomial(groups[partial],weights,rng)
+            for (j,cnt) in enumerate(counts):
+                if cnt > 0:
+                    new_groups[partial[:j]+(a,)+partial[j:]] = cnt
+        groups = new_groups
+    return groups
+
+def urn_profile_counts(A,ballot_count,alpha,rng):
+    """
+    Return a random profile of full ballots from the Polya-Eggenberger urn model
+    with contagion alpha > 0.  The urn starts with one copy of each of the m!
+    ballots; each voter draws a ballot from the urn, which is then returned
+    together with alpha*m! extra copies of it.
+
+    Equivalently, voter i+1 draws a fresh uniformly random ballot with probability
+    1/(1+alpha*i), and otherwise copies the ballot of a uniformly chosen earlier voter.
+    This is a Chinese restaurant process with concentration 1/alpha, so the voters
+    copying a given fresh ballot can be drawn all at once: the first remaining voter
+    starts a group whose size is 1 + Binomial(n-1,w), with w drawn from Beta(1,1/alpha),
+    and the rest of the voters form an independent urn process.
+    Running time is thus proportional to the number of groups, not to ballot_count.
+    """
+    P = { }
+    n = ballot_count
+    while n > 0:
+        w = 1.0 - rng.random()**alpha             # Beta(1,1/alpha)
+        size = 1 + random_binomial(n-1,w,rng)
+        ballot = A[:]
+        rng.shuffle(ballot)
+        ballot = tuple(ballot)
+        P[ballot] = P.get(ballot,0) + size
+        n -= size
+    return P
+
 def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=False):
     """
     Return a random profile P, a dict mapping 
@@ -498,6 +724,9 @@ def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=Fa
       ("uniform",)             -- for uniform distribution over B
       ("geometric",d)          -- for spatial d-dimensional model
       ("hypersphere",d)        -- for points on d-dimensional hypersphere
+      ("mallows",phi)          -- for Mallows model with dispersion phi around A
+      ("mallows",phi,R)        -- for Mallows model with dispersion phi around ranking R
+      ("urn",alpha)            -- for Polya-Eggenberger urn model with contagion alpha
 
     length_range is a pair (min_ballot_length,max_ballot_length) [or None]
     describing the allowed ballot lengths (inclusive).
@@ -507,26 +736,41 @@ def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=Fa
     to a length randomly chosen in length_range. 
 
     ballot_count gives the total desired number of ballots.
-    Running time is linear in ballot_count; for large ballot
-    counts this could perhaps be improved.
+    Running time is linear in ballot_count, except for the uniform
+    distribution with few candidates, and the mallows and urn models,
+    where the ballot counts are drawn directly (see uniform_profile_counts,
+    mallows_profile_counts, and urn_profile_counts) and the running time
+    depends on the number of distinct ballots rather than on ballot_count.
 
-    Seed is given so that experiment is reproducible.
+    Seed is given so that experiment is reproducible.  It is either an
+    integer or a random.Random object (such as one from rng_stream) that
+    supplies all the random numbers used; the global random module is not used.
     """
 
-    random.seed(seed)
+    rng = make_rng(seed)
 
     full_ballots = [ ]
 
     dist_ID = dist_type[0]
-    if dist_ID not in ["uniform","geometric","hypersphere"]:
+    if dist_ID not in ["uniform","geometric","hypersphere","mallows","urn"]:
         print "Illegal distribution descriptor for random profile generator:",dist_ID
         sys.exit()
 
+    if dist_ID == "urn" and dist_type[1] == 0:
+        dist_ID = "uniform"                 # no contagion: impartial culture
+
     if dist_ID == "uniform":
         # ("uniform")
+        if length_range == None:
+            lengths = [ len(A) ]
+        else:
+            lengths = range(length_range[0],length_range[1]+1)
+        cells = sum([ number_of_perms(len(A),r) for r in lengths ])
+        if cells <= max_multinomial_cells:
+            return uniform_profile_counts(A,ballot_count,lengths,rng)
         for i in range(ballot_count):       # toss ballots in randomly
             ballot = A[:]
-            random.shuffle(ballot)
+            rng.shuffle(ballot)
             full_ballots.append(ballot)
     elif dist_ID == "geometric":     
         # ("geometric", d)
@@ -534,15 +778,15 @@ def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=Fa
         # generate candidate vectors (position of each candidate on d issues)
         c = {}
         for a in A:
-            c[a] = [ random.random() for j in range(d)]
+            c[a] = [ rng.random() for j in range(d)]
         if printing_wanted:
             print "Candidates:",
             for a in sorted(A): print "%s:"%a,c[a],
             print
         for i in range(ballot_count):
             # generate voter vector v and issue importance vector s
-            v = [ random.random() for j in range(d)]
-            s = [ random.random() for j in range(d)]
+            v = [ rng.random() for j in range(d)]
+            s = [ rng.random() for j in range(d)]
             if printing_wanted:
                 print "Voter %d:"%i,v,s,
             # generate ballot for that voter:
@@ -553,18 +797,32 @@ def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=Fa
             full_ballots.append(ballot)
             if printing_wanted:
                 print L, ballot
+    elif dist_ID == "mallows":
+        # ("mallows",phi) or ("mallows",phi,reference)
+        phi = dist_type[1]
+        if len(dist_type) > 2:
+            reference = list(dist_type[2])
+        else:
+            reference = A
+        P = mallows_profile_counts(A,ballot_count,phi,reference,rng)
+        return truncate_profile_counts(P,length_range,rng)
+    elif dist_ID == "urn":
+        # ("urn",alpha)
+        alpha = dist_type[1]
+        P = urn_profile_counts(A,ballot_count,alpha,rng)
+        return truncate_profile_counts(P,length_range,rng)
     elif dist_ID == "hypersphere":
         # ("hypersphere",d)
         d = dist_type[1]
         # generate candidate vectors
         c = {}
         for a in A:
-            c[a] = random_hypersphere_point(d)
+            c[a] = random_hypersphere_point(d,rng)
         if printing_wanted:
             print "Candidates:"
             for a in sorted(A): print "%s:"%a,c[a]
         for i in range(ballot_count):
-            v = random_hypersphere_point(d)
+            v = random_hypersphere_point(d,rng)
             if printing_wanted:
                 print "Voter %d:"%i,v
             # generate ballot for that voter:
@@ -585,7 +843,7 @@ def random_profile(A,ballot_count,dist_type,length_range,seed,printing_wanted=Fa
     else:
         min_ballot_length,max_ballot_length = length_range
     for ballot in full_ballots:
-        ballot = ballot[:random.randint(min_ballot_length,max_ballot_length)]
+        ballot = ballot[:rng.randint(min_ballot_length,max_ballot_length)]
         ballot = tuple(ballot)
         if ballot in P:
             P[ballot] += 1
@@ -707,20 +965,23 @@ and always favor the candidate with the *smaller* value.
 """
 TB = { }
 
-def setup_TB(A,printing_wanted=True):
+def setup_TB(A,printing_wanted=True,rng=None):
     """ 
     Establish numeric tie-breaker values for each candidate a in A.
     Currently these are just the positions of the candidate in the sorted list of names
     so the alphabetically first candidate is always favored.  
     But this routine can be modified (by making use_random_TB_values True)
-    to generate random values instead.
+    to generate random values instead, using random number generator rng
+    (the global random module if rng is None).
     """
     global TB
     TB = { }
     value_list = range(len(A))
     use_random_TB_values = False
     if use_random_TB_values:
-        random.shuffle(value_list)
+        if rng == None:
+            rng = random
+        rng.shuffle(value_list)
     for a,v in zip(sorted(A),value_list):
         TB[a] = v
     if printing_wanted:
@@ -730,11 +991,19 @@ def setup_TB(A,printing_wanted=True):
             print str(a)+":"+str(TB[a])+" ",
         print
 
+"""
+Each voting method below is called as
+    method(A,P,params,election_ID,printing_wanted,rng)
+and returns a winner (or a list of winners).  The argument rng is the random
+number generator used by randomized methods (such as GT); deterministic methods
+ignore it.
+"""
+
 ########################################################################################
 ### Unanimous
 ########################################################################################
 
-def unanimous_winner(A,P,params,election_ID,printing_wanted=False):
+def unanimous_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return unanimous winner, if there is one (else return None).
     Unanimous winner has all voters giving winner first place.
@@ -755,7 +1024,7 @@ def unanimous_winner(A,P,params,election_ID,printing_wanted=False):
 ### Majority
 ########################################################################################
 
-def majority_winner(A,P,params,election_ID,printing_wanted=False):
+def majority_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return majority winner, if there is one (else return None).
     Majority winner has majority of voters giving candidate first place.
@@ -776,7 +1045,7 @@ def majority_winner(A,P,params,election_ID,printing_wanted=False):
 ### Plurality
 ########################################################################################
 
-def plurality_winners(A,P,params,election_ID,printing_wanted=False):
+def plurality_winners(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return list of all plurality winners (may be more than one if ties occur).
     """
@@ -792,7 +1061,7 @@ def plurality_winners(A,P,params,election_ID,printing_wanted=False):
             print indent+"Plurality winners are: ",string.join(map(str,winners))
     return winners
 
-def plurality_winner(A,P,params,election_ID,printing_wanted=False):
+def plurality_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return one of the plurality winners (the one with the smallest TB value).
     """
@@ -809,7 +1078,7 @@ def plurality_winner(A,P,params,election_ID,printing_wanted=False):
 ### Condorcet
 ########################################################################################
 
-def Condorcet_winner(A,P,params,election_ID,printing_wanted=False):
+def Condorcet_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return Condorcet winner, if one exists (else return None).
     Condorcet winner strictly beats every other in head-on-head competition.
@@ -834,7 +1103,7 @@ def Condorcet_winner(A,P,params,election_ID,printing_wanted=False):
 ### Borda
 ########################################################################################
 
-def Borda_winner(A,P,params,election_ID,printing_wanted=False):
+def Borda_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return Borda winner.
     Score of a candidate is the number of other candidates explicitly
@@ -865,7 +1134,7 @@ def Borda_winner(A,P,params,election_ID,printing_wanted=False):
 ### minimax
 ########################################################################################
 
-def minimax_winner(A,P,params,election_ID,printing_wanted=False):
+def minimax_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return minimax winner.
     Minimax winner is one whose worst loss is minimized.
@@ -890,7 +1159,7 @@ def minimax_winner(A,P,params,election_ID,printing_wanted=False):
 ### Smith sets
 ########################################################################################
 
-def Smith_set(A,P,params,election_ID,printing_wanted=False):
+def Smith_set(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Compute and return a list of the candidates in the Smith set.
     This is the smallest set of candidates such that every candidate in the
@@ -952,10 +1221,64 @@ def Smith_aux(a,A,index,I,L,stack,in_stack,pref,n):
         in_stack.remove(b)
     return (index,scc)
 
+########################################################################################
+### Uncovered sets
+########################################################################################
+
+def Uncovered_set(A,P,params,election_ID,printing_wanted=False,rng=None):
+    """
+    Compute and return a list of the candidates in the uncovered set.
+    Candidate a covers candidate b if a beats b, and a also beats every candidate
+    that b beats; the uncovered set is the set of candidates not covered by any other.
+    Here "a beats b" means that strictly more voters prefer a to b (so a candidate
+    tied with b does not count as beaten by b).  The uncovered set is contained in
+    the Smith set, and can be much smaller.
+
+    Here A = set of alternatives (candidates), and
+         P = profile (dict mapping ballots to counts).
+    """
+    if printing_wanted:
+        print "%s: Computing uncovered set."%election_ID
+    margin = pairwise_margins(A,P,params)
+    M = margin_matrix(A,margin)
+    uc = sorted([ A[i] for i in uncovered_indices(M) ])
+    if printing_wanted:
+        print indent+"Uncovered set is: "+string.join(uc)
+    return uc
+
+def uncovered_indices(M):
+    """
+    Return the sorted list of indices of the uncovered set of margin matrix M (list of rows).
+    Each row of the majority relation is kept as a bitset (an int whose bit j is set
+    if i beats j), so that "a beats everything b beats" is one AND-NOT of two ints.
+    """
+    m = len(M)
+    beats = [ sum([ 1<<j for j in range(m) if M[i][j] > 0 ]) for i in range(m) ]
+    uncovered = [ ]
+    for b in range(m):
+        bit = 1<<b
+        if not any([ (beats[a] & bit) and not (beats[b] & ~beats[a]) for a in range(m) ]):
+            uncovered.append(b)
+    return uncovered
+
 ########################################################################################
 ### IRV 
 ########################################################################################
 
+"""
+IRV is counted incrementally: each distinct ballot (with its "=" signs flushed)
+keeps a pointer to its top continuing choice, and sits in the bucket of that
+candidate; eliminating a candidate moves just the ballots in its bucket on to their
+next continuing choices, adjusting the counts as it goes.  So each ballot is read
+once in all, rather than once per candidate per round.
+
+A candidate with a majority of the continuing votes can never be eliminated, so with
+IRV_stop_at_majority on the count stops as soon as some candidate has one (unless
+printing is wanted, so that every round is still shown).
+"""
+
+IRV_stop_at_majority = True
+
 def IRV_count(A,P,elim):
     """
     Return dictionary "count" mapping candidates c to vote counts count[c]
@@ -965,30 +1288,77 @@ def IRV_count(A,P,elim):
     P = profile mapping B to nonnegative integers
     elim = list of eliminated candidates
     """
+    elim = set(elim)
     count = { }
     for c in A:
-        count[c] = sum([P[b] for b in ballots_for(P.keys(),c,elim)])
+        count[c] = 0
+    for ballot in P:
+        for x in ballot:
+            if x != "=" and x not in elim:
+                if count.has_key(x):
+                    count[x] += P[ballot]
+                break
     return count
 
-def IRV_winner(A,P,params,election_ID,printing_wanted=False):
+def IRV_rounds(A,P):
     """
-    Return IRV winner for a given profile P
+    Generate (count,loser) for each round of IRV on profile P, until one candidate
+    remains: count is the dict of vote counts (as from IRV_count) at the start of the
+    round, and loser the candidate then eliminated (ties broken by TB values).
+    count is updated in place when the next round is generated.
 
     A = list of alternatives (candidates)
     P = profile mapping ballots to non-negative integers
     """
     global TB                       # tie-breaker values (smaller is better)
-    if printing_wanted:
-        print "%s: Computing IRV winner."%election_ID
+    ballots = [ (filter(lambda x: x != "=", ballot),P[ballot]) for ballot in P if P[ballot] > 0 ]
+    top = [ 0 ] * len(ballots)      # position of each ballot's top continuing choice
+    count = { }
+    bucket = { }                    # candidate --> indices of ballots whose top choice it is
+    for c in A:
+        count[c] = 0
+        bucket[c] = [ ]
+    for (k,(ballot,n)) in enumerate(ballots):
+        if len(ballot)>0 and count.has_key(ballot[0]):
+            count[ballot[0]] += n
+            bucket[ballot[0]].append(k)
     remaining = A[:]                # candidates not yet eliminated
-    elim = []                       # candidates eliminated
+    elim = set()                    # candidates eliminated
     while len(remaining)>1:
-        count = IRV_count(A,P,elim)
-        L = sorted( [ (count[c],-TB[c],c) for c in remaining ] )  
+        L = sorted( [ (count[c],-TB[c],c) for c in remaining ] )
         loser = L[0][2]          # a candidate with smallest count (and larger TB value if tied)
+        yield (count,loser)
+        remaining.remove(loser)
+        elim.add(loser)
+        for k in bucket.pop(loser):
+            (ballot,n) = ballots[k]
+            i = top[k]
+            while i < len(ballot) and ballot[i] in elim:
+                i += 1
+            top[k] = i
+            if i < len(ballot) and bucket.has_key(ballot[i]):
+                count[ballot[i]] += n
+                bucket[ballot[i]].append(k)
+        count[loser] = 0
+
+def IRV_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
+    """
+    Return IRV winner for a given profile P
+
+    A = list of alternatives (candidates)
+    P = profile mapping ballots to non-negative integers
+    """
+    if printing_wanted:
+        print "%s: Computing IRV winner."%election_ID
+    remaining = A[:]                # candidates not yet eliminated
+    for (count,loser) in IRV_rounds(A,P):
+        if IRV_stop_at_majority and not printing_wanted:
+            leader = max(remaining,key=lambda c: count[c])
+            if 2*count[leader] > sum(count.values()):
+                remaining = [ leader ]
+                break
         # note ties broken in favor of eliminating candidate whose name sorts earlier
         remaining.remove(loser)
-        elim.append(loser)
         if printing_wanted: 
             print indent+"Round %d votes counts:"%(len(A)-len(remaining)),
             L = sorted([ (count[alt],alt) for alt in count.keys() ])
@@ -1043,7 +1413,7 @@ def maxD( p, q):
     else:
         return q
 
-def beatpath_potential_winners(A,P,params,election_ID,printing_wanted=False):
+def beatpath_potential_winners(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return list of potential winner(s) according to Schulze's ``beatpath'' method.
     Code adapted from Markus Schulze's August 2009 paper,
@@ -1072,7 +1442,7 @@ def beatpath_potential_winners(A,P,params,election_ID,printing_wanted=False):
     winners = list(winners)
     return winners
 
-def beatpath_winner(A,P,params,election_ID,printing_wanted=False):
+def beatpath_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     # This is the high-level call to Schulze's ``beatpath'' method
     # It finds all beatpath potential winners, and then returns just one of them.
     # This routine just picks the one with the smallest TB (tie-breaker) value.
@@ -1107,26 +1477,563 @@ def print_optimal_mixed_strategy(A,x,printing_wanted=False):
             print "%s:%11.6f "%(ai,cp),
         print
 
-def gt_optimal_mixed_strategy(A,P,params,election_ID,printing_wanted=False):
+def margin_matrix(A,margin):
+    """
+    Return the margin dict as a *matrix* (list of rows), rows and columns in the order of A.
+    """
+    m = len(A)
+    M = [ [0]*m for i in range(m) ]
+    for i in range(m):
+        for j in range(m):
+            M[i][j] = margin[A[i],A[j]]
+    return M
+
+"""
+Solutions of GT games are memoized, keyed on the margin matrix, so that GT, GTD,
+GTS, and compare_methods share one QP solve (and one LP solve) per distinct margin
+matrix.  Both the full game given to gt_solve and the reduced game actually solved
+are memoized, so a repeated game is answered without redoing the reductions.
+gt_cache_stats counts the cache hits and misses for each kind of solve.
+The cache is simply emptied when it reaches gt_cache_max_entries entries.
+
+Solutions can also be kept across runs (and shared by worker processes) in an
+on-disk cache, by setting gt_persistent_cache to a game_cache.GameCache object, e.g.
+    vs.gt_persistent_cache = game_cache.GameCache("gt_cache.sqlite")
+It is consulted when a solution is not in the (in-memory) memo cache.
+"""
+gt_solution_cache = { }
+gt_cache_stats = { "qp": { "hits": 0, "misses": 0, "disk hits": 0 },
+                   "exact": { "hits": 0, "misses": 0, "disk hits": 0 },
+                   "lp": { "hits": 0, "misses": 0, "disk hits": 0 } }
+gt_cache_max_entries = 100000
+gt_cache_lock = threading.Lock()
+gt_persistent_cache = None
+
+"""
+When gt_warm_start is True, cache misses are solved by a game_cvxopt.GameSolver
+(one per number of candidates, in each thread), which warm-starts each solve from
+the previous solution of the same size.  This pays off when successive games are
+closely related, e.g. when re-tallying after a small change to the ballots.
+"""
+gt_warm_start = False
+gt_game_solvers = threading.local()
+
+"""
+When gt_solver_pool is a game_cvxopt.SolverPool (see start_gt_solver_pool),
+cache misses are solved in its worker processes, with a timeout per solve and a
+chain of fallbacks when a solve times out or fails; gt_solver_path_stats counts
+how many answers each path of the chain produced.  (This bypasses gt_warm_start.)
+"""
+gt_solver_pool = None
+gt_solver_path_stats = { }
+
+def start_gt_solver_pool(workers=None,timeout=None):
+    """
+    Start solving GT games in a pool of worker processes (see gt_solver_pool).
+    """
+    global gt_solver_pool
+    if gt_solver_pool == None:
+        gt_solver_pool = game_cvxopt.SolverPool(workers,timeout)
+
+def stop_gt_solver_pool():
+    global gt_solver_pool
+    if gt_solver_pool != None:
+        gt_solver_pool.close()
+        gt_solver_pool = None
+
+def gt_game_solver(m):
+    """
+    Return this thread's game_cvxopt.GameSolver for games with m candidates.
+    """
+    if not hasattr(gt_game_solvers,"by_size"):
+        gt_game_solvers.by_size = { }
+    if m not in gt_game_solvers.by_size:
+        gt_game_solvers.by_size[m] = game_cvxopt.GameSolver(m)
+    return gt_game_solvers.by_size[m]
+
+"""
+Fast paths skip the solver (and the caches) when the solution is known in advance.
+When the margin matrix has a Condorcet winner (a row that is positive off the
+diagonal), the unique optimal mixed strategy is the pure strategy on that
+candidate; this is detected in O(m**2) time.  gt_fast_path_stats counts how often
+each fast path fires.
+"""
+gt_condorcet_fast_path = True
+gt_fast_path_stats = { "condorcet": 0 }
+
+"""
+Reductions replace a game by a smaller one with the same solutions (lifted back
+with zeros for the candidates dropped).  The support of every optimal mixed
+strategy lies inside the Smith set (the smallest set of candidates each of which
+strictly beats every candidate outside it; see Smith_set): if p is optimal and
+D is the Smith set, then
+    0 = p^T M p = p_D^T M p + p_O^T M p,
+where O is the complement of D, and both terms are <= 0 since M p <= 0; but
+p_D^T M p = p_D^T M_DO p_O > 0 unless p_D or p_O is zero, and p_O = p cannot be
+optimal since every candidate in D beats it.  Conversely, every optimal
+strategy of the game restricted to D is optimal for the whole game, since each
+candidate outside D loses to it.  So with gt_smith_reduction on, gt_solve solves
+the game on the Smith set only.
+
+The support also excludes every candidate b that is covered by another candidate
+a in the margin matrix, meaning that a beats b and M[a][c] >= M[b][c] for every
+other candidate c: then (M p)_a - (M p)_b >= M[a][b] (p_a + p_b), which would
+be positive if p_b > 0 (given (M p)_b = 0 on the support).  Dropping all covered
+candidates at once is also exact, since this covering relation is transitive, so
+every covered candidate is covered by an uncovered one, which keeps it from
+beating any solution of the reduced game.  So with gt_covering_reduction on,
+covered candidates are dropped too.  (The uncovered set of the majority
+relation, computed by Uncovered_set, ignores the sizes of the margins, and the
+support of the optimal strategy need not lie inside it: e.g. with margins
+    A-B 5, A-C 1, A-D 1, A-E -7, A-F -7, B-C -5, B-D -13, B-E -1, B-F -9,
+    C-D 3, C-E -7, C-F -5, D-E 3, D-F 1, E-F -7
+A covers C in the majority relation, yet C has probability 1/9 in the solution.
+So the GT family prunes only with the margin covering relation above.)
+In particular a candidate whose row of margins is strictly dominated by another's
+(M[a][c] > M[b][c] for all c) is covered, so iterated elimination of strictly
+dominated strategies is part of this reduction.  (Weakly dominated strategies
+cannot be dropped this way: they may be in the support of the balanced strategy.)
+
+Clones -- candidates tied with each other and with identical margins against
+everyone else -- are collapsed into one candidate (with gt_clone_reduction on).
+The optimal strategies of the full game are exactly those of the collapsed game,
+with each clone group's probability split among the clones in any way.  The
+balanced strategy splits it equally; so the collapsed game must be balanced with
+weights, minimizing the sum of x_g**2 / k_g for a group g of k_g clones.  Such
+weighted games are solved by game_cvxopt.exact_solve_game (with multiplicity).
+
+The reductions are applied repeatedly (gt_reduce_and_solve recurses on the reduced game).
+With gt_verify_reduction on, the lifted solution is checked against the full game
+(and the full game solved if the check fails).  gt_reduction_stats counts the
+games reduced by each reduction.
+"""
+gt_smith_reduction = True
+gt_covering_reduction = True
+gt_clone_reduction = True
+gt_covering_max_size = 300          # covering takes O(m**3) time, so skip it for huge games
+gt_verify_reduction = False
+gt_verify_tolerance = 1e-6
+gt_reduction_stats = { "smith": 0, "covering": 0, "clones": 0 }
+gt_verify_stats = { "checks": 0, "failures": 0 }
+
+def smith_indices(M):
+    """
+    Return the sorted list of indices of the Smith set of margin matrix M (list of rows),
+    with the same treatment of ties as Smith_set: the smallest set of candidates each
+    of which strictly beats every candidate outside it.
+
+    A candidate in the Smith set D weakly beats at least m-|D| others, and one outside
+    weakly beats at most m-|D|-1 others, so D is a prefix of the candidates sorted by
+    number of weak wins.
+    """
+    m = len(M)
+    weak_wins = [ len([ j for j in range(m) if j != i and M[i][j] >= 0 ]) for i in range(m) ]
+    order = sorted(range(m), key=lambda i: -weak_wins[i])
+    # count = number of pairs (i,j), i in prefix and j outside, with i beating j
+    in_prefix = [ False ] * m
+    count = 0
+    for k in range(1,m+1):
+        c = order[k-1]
+        in_prefix[c] = True
+        count += len([ j for j in range(m) if not in_prefix[j] and M[c][j] > 0 ])
+        count -= len([ i for i in range(m) if in_prefix[i] and M[i][c] > 0 ])
+        if count == k * (m-k):
+            return sorted(order[:k])
+
+def gt_solve(M,kind="qp",multiplicity=None,printing_wanted=False):
+    """
+    Return solution of the two-person zero-sum game with margin matrix M (list of rows).
+    kind is "qp" for the balanced optimal mixed strategy (game_cvxopt.qp_solver),
+    "lp" for some optimal mixed strategy (game_cvxopt.lp_solver), or "exact" for
+    the balanced optimal mixed strategy as a list of Fractions (game_cvxopt.exact_solve_game).
+    A game already in gt_solution_cache is answered before any reduction is tried;
+    otherwise games with a Condorcet winner are answered directly (see
+    gt_condorcet_fast_path), and other games are reduced as far as possible (see
+    gt_reduction) before being solved by gt_solve_game.
+    multiplicity is used when M is itself a reduced game: candidate i stands for
+    multiplicity[i] clones, and the balancing is weighted accordingly.
+    If printing_wanted, report how the game is solved (reduced size, solver backend).
+    """
+    key = gt_solution_key(M,kind,multiplicity)
+    with gt_cache_lock:
+        x = gt_solution_cache.get(key)
+        if x != None:
+            gt_cache_stats[kind]["hits"] += 1
+    if x != None:
+        if printing_wanted:
+            print indent+"Solution found in GT solution cache"
+        return x[:]
+    (x,memoize) = gt_reduce_and_solve(M,kind,multiplicity,printing_wanted,len(M))
+    if memoize:
+        gt_memoize_solution(key,x)
+    return x[:]
+
+def gt_reduce_and_solve(M,kind,multiplicity,printing_wanted,full_size):
+    """
+    Return (x,memoize) for gt_solve: the solution x of the game with margin matrix M,
+    found by the fast paths and reductions (applied repeatedly) and then gt_solve_game,
+    and whether x may be memoized (False for fast-path and approximate answers).
+    full_size is the number of candidates in the game given to gt_solve.
+    """
+    m = len(M)
+    if gt_condorcet_fast_path:
+        i = game_cvxopt.condorcet_index(M)
+        if i != None:
+            with gt_cache_lock:
+                gt_fast_path_stats["condorcet"] += 1
+            if printing_wanted:
+                print indent+"Condorcet winner exists (pure strategy, no solver needed)"
+            return (pure_strategy(m,i,kind),False)
+    reduction = gt_reduction(M)
+    if reduction != None:
+        (name,groups) = reduction
+        with gt_cache_lock:
+            gt_reduction_stats[name] += 1
+        if multiplicity == None:
+            multiplicity = [ 1 ] * m
+        S = [ group[0] for group in groups ]
+        S_multiplicity = [ sum([ multiplicity[i] for i in group ]) for group in groups ]
+        if max(S_multiplicity) == 1:
+            S_multiplicity = None
+        (x_S,memoize) = gt_reduce_and_solve([ [ M[i][j] for j in S ] for i in S ],kind,
+                                            S_multiplicity,printing_wanted,full_size)
+        x = expand_strategy(m,groups,x_S,multiplicity,kind)
+        if gt_verify_reduction:
+            x = gt_verify_lifted(M,x,kind,multiplicity)
+        return (x,memoize)
+    if printing_wanted:
+        if m < full_size:
+            print indent+"Solving on reduced game (%d of %d candidates)"%(m,full_size)
+        if kind == "qp":
+            print indent+"Using %s qp_solver (quadratic programming --> balanced soln)"% \
+                  game_cvxopt.select_backend("qp",m).name
+        elif kind == "lp":
+            print indent+"Using %s lp_solver (linear programming --> soln may be unbalanced)"% \
+                  game_cvxopt.select_backend("lp",m).name
+    return gt_solve_game(M,kind,multiplicity)
+
+def gt_reduction(M):
+    """
+    Return (name,groups) for the first reduction that applies to margin matrix M, or
+    None if none applies.  groups is a list of lists of candidate indices: each group
+    becomes one candidate of the reduced game (represented by its first member), and
+    candidates in no group are dropped.
+    """
+    m = len(M)
+    if gt_smith_reduction:
+        S = smith_indices(M)
+        if len(S) < m:
+            return ("smith",[ [ i ] for i in S ])
+    if gt_covering_reduction and m <= gt_covering_max_size:
+        S = margin_uncovered_indices(M)
+        if len(S) < m:
+            return ("covering",[ [ i ] for i in S ])
+    if gt_clone_reduction:
+        groups = clone_groups(M)
+        if len(groups) < m:
+            return ("clones",groups)
+    return None
+
+def clone_groups(M):
+    """
+    Return list of the groups of clones in margin matrix M (list of rows), each a
+    list of indices in increasing order, where i and j are clones if they are tied
+    (M[i][j] == 0) and have identical margins against every other candidate.
+    Since M is antisymmetric, that just means that rows i and j of M are equal.
+    """
+    groups = [ ]
+    group_of_row = { }
+    for (i,row) in enumerate(M):
+        key = tuple(row)
+        if key in group_of_row:
+            group_of_row[key].append(i)
+        else:
+            group_of_row[key] = [ i ]
+            groups.append(group_of_row[key])
+    return groups
+
+def margin_uncovered_indices(M):
+    """
+    Return the sorted list of indices of candidates not covered in margin matrix M
+    (list of rows), where a covers b if M[a][b] > 0 and M[a][c] >= M[b][c] for all
+    other c.
+    """
+    m = len(M)
+    uncovered = [ ]
+    for b in range(m):
+        Mb = M[b]
+        covered = False
+        for a in range(m):
+            if M[a][b] > 0:
+                Ma = M[a]
+                if all([ Ma[c] >= Mb[c] for c in range(m) if c != a and c != b ]):
+                    covered = True
+                    break
+        if not covered:
+            uncovered.append(b)
+    return uncovered
+
+def pure_strategy(m,i,kind="qp"):
+    """
+    Return the pure strategy on candidate i (of m), with exact entries if kind is "exact".
+    """
+    if kind == "exact":
+        x = [ fractions.Fraction(0) ] * m
+        x[i] = fractions.Fraction(1)
+    else:
+        x = [ 0.0 ] * m
+        x[i] = 1.0
+    return x
+
+def expand_strategy(m,groups,x_S,multiplicity,kind="qp"):
+    """
+    Return the mixed strategy on m candidates that shares probability x_S[t] among the
+    candidates in groups[t], in proportion to their multiplicities (equally, for plain
+    clones), and gives zero to all other candidates.
+    """
+    if kind == "exact":
+        x = [ fractions.Fraction(0) ] * m
+    else:
+        x = [ 0.0 ] * m
+    for (t,group) in enumerate(groups):
+        total = sum([ multiplicity[i] for i in group ])
+        for i in group:
+            x[i] = x_S[t] * multiplicity[i] / total
+    return x
+
+def gt_verify_lifted(M,x,kind,multiplicity=None):
+    """
+    Return x if it is optimal for the full game with margin matrix M; otherwise
+    report the failure and return the solution of the full game.
+    """
+    ok = gt_is_optimal(M,x)
+    with gt_cache_lock:
+        gt_verify_stats["checks"] += 1
+        if not ok:
+            gt_verify_stats["failures"] += 1
+    if not ok:
+        print "Warning: solution of reduced game is not optimal for full game; re-solving."
+        x = gt_solve_game(M,kind,multiplicity)[0]
+    return x
+
+def gt_is_optimal(M,x):
+    """
+    Return True if mixed strategy x is optimal for the game with margin matrix M,
+    i.e. (M x)_i <= 0 for every candidate i: exactly if x has Fraction entries,
+    and otherwise up to gt_verify_tolerance times the largest margin.
+    """
+    m = len(M)
+    if any([ isinstance(xi,fractions.Fraction) for xi in x ]):
+        tolerance = 0
+    else:
+        tolerance = gt_verify_tolerance * max([ 1 ] + [ abs(Mij) for row in M for Mij in row ])
+    return all([ sum([ M[i][j]*x[j] for j in range(m) ]) <= tolerance for i in range(m) ])
+
+def gt_solution_key(M,kind,multiplicity=None):
+    """
+    Return the key of the solution of the given kind of the game with margin matrix M
+    (and multiplicity, if given) in gt_solution_cache.
+    """
+    if kind == "lp":
+        multiplicity = None                 # any optimal strategy will do
+    key = (kind,tuple([tuple(row) for row in M]))
+    if multiplicity != None:
+        key = key + (tuple(multiplicity),)
+    return key
+
+def gt_memoize_solution(key,x):
+    with gt_cache_lock:
+        if len(gt_solution_cache) >= gt_cache_max_entries:
+            gt_solution_cache.clear()
+        gt_solution_cache[key] = x
+
+def gt_solve_game(M,kind="qp",multiplicity=None):
+    """
+    Return (x,memoized): the solution x (of the given kind; see gt_solve) of the game
+    with margin matrix M, from the caches or by calling the solver, and whether it
+    was memoized.
+    Balancing with multiplicities (see gt_solve) is done by game_cvxopt.exact_solve_game
+    for games with at most game_cvxopt.exact_max_size candidates, and otherwise by
+    game_cvxopt.qp_solver with the multiplicities weighting its objective.
+    The solver backend is chosen by game_cvxopt.select_backend (see game_cvxopt.solver_backend);
+    by default games with at most game_cvxopt.exact_max_size candidates are solved
+    exactly by support enumeration.
+    Solutions are memoized in gt_solution_cache.  (Exact solutions are not kept in
+    gt_persistent_cache, which stores floats, and approximate solutions from the
+    worker pool's "first order" fallback are not kept at all.)
+    """
+    if kind == "lp":
+        multiplicity = None                 # any optimal strategy will do
+    key = gt_solution_key(M,kind,multiplicity)
+    with gt_cache_lock:
+        x = gt_solution_cache.get(key)
+        if x != None:
+            gt_cache_stats[kind]["hits"] += 1
+            return (x[:],True)
+        gt_cache_stats[kind]["misses"] += 1
+    x = None
+    memoize = True
+    if gt_persistent_cache != None and kind != "exact" and multiplicity == None:
+        x = gt_persistent_cache.get(kind,M)
+        if x != None:
+            with gt_cache_lock:
+                gt_cache_stats[kind]["disk hits"] += 1
+    if x == None and kind == "exact":
+        x = game_cvxopt.exact_solve_game(M,"qp",multiplicity)
+    elif x == None and multiplicity != None and len(M) <= game_cvxopt.exact_max_size:
+        x = [ float(xi) for xi in game_cvxopt.exact_solve_game(M,"qp",multiplicity) ]
+    elif x == None and multiplicity != None:
+        x = game_cvxopt.qp_solver(M,multiplicity=multiplicity)
+    elif x == None and gt_solver_pool != None:
+        (x,path) = gt_solver_pool.solve(M,kind)
+        with gt_cache_lock:
+            gt_solver_path_stats[path] = gt_solver_path_stats.get(path,0) + 1
+        memoize = (path != "first order")       # only approximate (and uncertified)
+        if gt_persistent_cache != None and memoize:
+            gt_persistent_cache.put(kind,M,x)
+    elif x == None:
+        if gt_warm_start and len(M) > game_cvxopt.exact_max_size:
+            solver = gt_game_solver(len(M))
+        else:
+            solver = game_cvxopt.select_backend(kind,len(M))
+        if kind == "qp":
+            x = solver.qp_solver(M)
+        else:
+            x = solver.lp_solver(M)
+        if gt_persistent_cache != None:
+            gt_persistent_cache.put(kind,M,x)
+    if memoize:
+        gt_memoize_solution(key,x)
+    return (x[:],memoize)
+
+def clear_gt_solution_cache():
+    """
+    Empty the GT solution cache and reset its counters (and the fast path and reduction counters).
+    """
+    with gt_cache_lock:
+        gt_solution_cache.clear()
+        for kind in gt_cache_stats:
+            for name in gt_cache_stats[kind]:
+                gt_cache_stats[kind][name] = 0
+        for name in gt_fast_path_stats:
+            gt_fast_path_stats[name] = 0
+        for name in gt_reduction_stats:
+            gt_reduction_stats[name] = 0
+        for name in gt_verify_stats:
+            gt_verify_stats[name] = 0
+        gt_solver_path_stats.clear()
+
+def print_gt_cache_stats():
+    print "GT solution cache:"
+    for kind in sorted(gt_cache_stats):
+        stats = gt_cache_stats[kind]
+        print indent+"%s solves: %d hits, %d misses (%d of them found in persistent cache)"% \
+              (kind,stats["hits"],stats["misses"],stats["disk hits"])
+    for name in sorted(gt_fast_path_stats):
+        print indent+"%s fast path: %d games (no solve needed)"%(name,gt_fast_path_stats[name])
+    for name in sorted(gt_reduction_stats):
+        print indent+"%s reduction: %d games"%(name,gt_reduction_stats[name])
+    for path in sorted(gt_solver_path_stats):
+        print indent+"solved in worker pool by path `%s': %d games"%(path,gt_solver_path_stats[path])
+    if gt_verify_stats["checks"] > 0:
+        print indent+"reduced solutions checked against full game: %d (%d failures)"% \
+              (gt_verify_stats["checks"],gt_verify_stats["failures"])
+
+"""
+In approximate mode (gt_approximate on, or approximate=True given to
+gt_optimal_mixed_strategy), the GT strategy is computed by the first-order solver
+game_cvxopt.first_order_iterates instead, which stops once the duality gap of its
+strategy is at most gt_approximate_gap times the largest absolute margin (or after
+gt_approximate_time_budget seconds).  The Condorcet fast path and the Smith set
+reduction still apply, since they are exact and cheap; the solutions are not cached.
+With gt_approximate_progress on, each intermediate strategy's gap is printed.
+Multiplicative weights leaves a little probability on every candidate, so that
+supports (e.g. GTS winners) are not inflated, candidates i doing clearly badly
+against the strategy x ((M x)_i < -gt_approximate_support_factor * gap; these have
+zero probability in every optimal strategy once the gap is small enough) are then
+given probability zero, unless that would more than double the gap.
+"""
+gt_approximate = False
+gt_approximate_gap = 1e-3
+gt_approximate_time_budget = 10.0   # seconds
+gt_approximate_progress = False
+gt_approximate_support_factor = 10.0
+
+def gt_approximate_solve(M):
+    """
+    Return (x,gap): an approximate optimal mixed strategy for the game with margin
+    matrix M (list of rows), and its duality gap (zero if it is exact).
+    """
+    m = len(M)
+    if gt_condorcet_fast_path:
+        i = game_cvxopt.condorcet_index(M)
+        if i != None:
+            with gt_cache_lock:
+                gt_fast_path_stats["condorcet"] += 1
+            return (pure_strategy(m,i),0.0)
+    if gt_smith_reduction:
+        S = smith_indices(M)
+    else:
+        S = range(m)
+    for (x_S,gap,iterations,seconds) in \
+            game_cvxopt.first_order_iterates([ [ M[i][j] for j in S ] for i in S ],
+                                             gt_approximate_gap,gt_approximate_time_budget):
+        if gt_approximate_progress:
+            print indent+"after %d iterations (%.2f seconds): duality gap %g"%(iterations,seconds,gap)
+    if gap > 0.0:
+        g = [ sum([ M[i][j]*xj for (j,xj) in zip(S,x_S) ]) for i in S ]
+        trimmed = [ (xk,0.0)[g[k] < -gt_approximate_support_factor*gap] for (k,xk) in enumerate(x_S) ]
+        trimmed = [ xk / sum(trimmed) for xk in trimmed ]
+        trimmed_gap = 2 * max(max([ sum([ M[i][j]*xj for (j,xj) in zip(S,trimmed) ]) for i in S ]),0.0)
+        if trimmed_gap <= 2 * gap:
+            (x_S,gap) = (trimmed,trimmed_gap)
+    x = expand_strategy(m,[ [ i ] for i in S ],x_S,[ 1 ] * m)
+    return (x,gap)
+
+def gt_optimal_mixed_strategy(A,P,params,election_ID,printing_wanted=False,approximate=None):
     """
     Return optimal balanced mixed strategy for two-person zero-sum game for this election
     uses quadratic programming solver
+    If approximate is True (default: gt_approximate), uses the first-order solver
+    instead (see gt_approximate_solve), for a strategy optimal to within gt_approximate_gap.
     """
     margin = pairwise_margins(A,P,params)           # note this is a dict
     if printing_wanted:
         print_matrix(A,margin)
-    m = len(A)
-    M = [ [0]*m for i in range(m) ]                 # make margin *matrix* (not dict)
-    for i in range(m):
-        for j in range(m):
-            M[i][j] = margin[A[i],A[j]]
+    M = margin_matrix(A,margin)                     # make margin *matrix* (not dict)
+
+    if approximate == None:
+        approximate = gt_approximate
+    if approximate:
+        print indent+"Using first-order solver (approximate --> soln within relative gap %g)"% \
+              gt_approximate_gap
+        (x,gap) = gt_approximate_solve(M)
+        print indent+"Duality gap of approximate soln: %g"%gap
+        print_optimal_mixed_strategy(A,x,printing_wanted)
+        return x
 
-    print indent+"Using game_cvxopt.qp_solver (quadratic programming --> balanced soln)"
-    qp_x = game_cvxopt.qp_solver(M)                     
+    qp_x = gt_solve(M,"qp",printing_wanted=printing_wanted)
     print_optimal_mixed_strategy(A,qp_x,printing_wanted)
 
     return qp_x
 
+def gt_exact_mixed_strategy(A,P,params,election_ID,printing_wanted=False):
+    """
+    Return balanced optimal mixed strategy for two-person zero-sum game for this election,
+    computed exactly (a list of Fractions; see game_cvxopt.exact_solve_game).
+    """
+    margin = pairwise_margins(A,P,params)           # note this is a dict
+    if printing_wanted:
+        print_matrix(A,margin)
+    M = margin_matrix(A,margin)
+
+    if printing_wanted:
+        print indent+"Using exact solver (rational arithmetic --> balanced soln)"
+    exact_x = gt_solve(M,"exact")
+    print_optimal_mixed_strategy(A,exact_x,printing_wanted)
+
+    return exact_x
+
 def gt_optimal_mixed_strategy_lp(A,P,params,election_ID,printing_wanted=False):
     """
     Return an optimal mixed strategy for two-person zero-sum game for this election
@@ -1134,27 +2041,82 @@ def gt_optimal_mixed_strategy_lp(A,P,params,election_ID,printing_wanted=False):
     margin = pairwise_margins(A,P,params)           # note this is a dict
     if printing_wanted:
         print_matrix(A,margin)
-    m = len(A)
-    M = [ [0]*m for i in range(m) ]
-    for i in range(m):
-        for j in range(m):
-            M[i][j] = margin[A[i],A[j]]
+    M = margin_matrix(A,margin)
 
-    print indent+"Using game_cvxopt.lp_solver (linear programming --> soln may be unbalanced)"
-    lp_x = game_cvxopt.lp_solver(M)                     
+    lp_x = gt_solve(M,"lp",printing_wanted=printing_wanted)
     print_optimal_mixed_strategy(A,lp_x,printing_wanted)
 
     return lp_x
 
-def non_uniform_picker(x,L):
+"""
+gt_sensitivity_path shows how the GT strategy changes as the count of one ballot
+varies, e.g. for recount-risk analysis: the margin matrix for count P[ballot]+delta
+is M + delta D, where D is the margin matrix of that ballot alone, so
+game_cvxopt.parametric_path traces the balanced strategy over a range of delta
+(piecewise rational in delta, with breakpoints where its support changes), at the
+cost of one QP plus a few linear solves per piece rather than one QP per sample.
+Ties between candidates happen at integer deltas, where the GT strategy may differ
+from those just before and after; these get pieces of their own.
+With gt_sensitivity_verify on, the strategy at every integer delta is checked
+against game_cvxopt.exact_solve_game (to within gt_verify_tolerance), and the checks
+and failures are counted in gt_sensitivity_verify_stats.
+"""
+gt_sensitivity_verify = False
+gt_sensitivity_verify_stats = { "checks": 0, "failures": 0 }
+
+def gt_sensitivity_path(A,P,params,ballot,delta_min,delta_max,election_ID,printing_wanted=False):
+    """
+    Return the pieces (see game_cvxopt.parametric_path) of the path of balanced optimal
+    mixed strategies for this election when the count of ballot is changed by delta,
+    for delta_min <= delta <= delta_max (delta_min is raised to -P[ballot] if need be).
+    The strategy for a given delta is game_cvxopt.parametric_strategy(M,D,pieces,delta),
+    where M and D are the margin matrices of P and of ballot alone.
+    """
+    M = margin_matrix(A,pairwise_margins(A,P,params))
+    D = margin_matrix(A,pairwise_margins(A,{ ballot: 1 },params))
+    delta_min = max(delta_min,-P.get(ballot,0))
+    pieces = game_cvxopt.parametric_path(M,D,delta_min,delta_max)
+    if gt_sensitivity_verify:
+        for delta in range(int(math.ceil(delta_min)),int(math.floor(delta_max))+1):
+            x = game_cvxopt.parametric_strategy(M,D,pieces,delta)
+            G = [ [ M[i][j] + delta*D[i][j] for j in range(len(A)) ] for i in range(len(A)) ]
+            exact_x = game_cvxopt.exact_solve_game(G,"qp")
+            gt_sensitivity_verify_stats["checks"] += 1
+            if max([ abs(xi-float(yi)) for (xi,yi) in zip(x,exact_x) ]) > gt_verify_tolerance:
+                gt_sensitivity_verify_stats["failures"] += 1
+                if printing_wanted:
+                    print indent+"GT strategy at delta %d differs from exact solution"%delta
+    if printing_wanted:
+        print "%s: GT strategy as the count of ballot %s changes by %g to %g:"% \
+              (election_ID,ballot,delta_min,delta_max)
+        shown = [ ]                            # pieces merged while the support stays the same
+        for piece in pieces:
+            if shown and shown[-1]["support"] == piece["support"]:
+                shown[-1]["to"] = piece["to"]
+                shown[-1]["certified"] = shown[-1]["certified"] and piece["certified"]
+            else:
+                shown.append(dict(piece))
+        for piece in shown:
+            note = ""
+            if not piece["certified"]:
+                note = " (not certified)"
+            print indent+"delta %12.6f to %12.6f: support %s%s"% \
+                  (piece["from"],piece["to"],string.join([ A[i] for i in piece["support"] ]," "),note)
+        stats = game_cvxopt.parametric_stats
+        print indent+"(%d QP solves, %d direct solves, %d linear solves)"% \
+              (stats["qp solves"],stats["direct solves"],stats["linear solves"])
+    return pieces
+
+def non_uniform_picker(x,L,rng):
     """
     Input: L is a nonempty list.
            x is a length of probabilities, as long as L.
            (The elements of x should be nonnegative and sum to 1.)
+           rng is the random number generator to use.
     Return an element of L, picked with probability as given in x.
     """
     cum_prob = 0.0
-    test_value = random.random()
+    test_value = rng.random()
     ans = None
     for prob,cand in zip(x,L):
         cum_prob += prob
@@ -1173,28 +2135,32 @@ def gt_support(A,x):
     Here A and x have the same length.  
     A is the list of candidates.
     x is a list of their probabilities.
-    Probability is `non-zero' if it is greater than epsilon = 1e-6.
+    Probability is `non-zero' if it is greater than epsilon = 1e-6,
+    or if it is a positive Fraction (an exact solution; see gt_exact_mixed_strategy).
     """
     epsilon = 1e-6
     support = [ ]
     for (xi,a) in zip(x,A):
-        if xi >= epsilon:
+        if xi >= epsilon or (isinstance(xi,fractions.Fraction) and xi > 0):
             support.append(a)
     return support
 
-def gt_winner(A,P,params,election_ID,printing_wanted=False):
+def gt_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return winner according to GT voting system.
+    The lottery uses random number generator rng (the global random module if rng is None).
     """
     if printing_wanted:
         print "%s: Computing GT winner."%election_ID
+    if rng == None:
+        rng = random
     x = gt_optimal_mixed_strategy(A,P,params,election_ID,printing_wanted)
-    gt_winner = non_uniform_picker(x,A)
+    gt_winner = non_uniform_picker(x,A,rng)
     if printing_wanted:
         print indent+"GT winner is",gt_winner, " (randomly chosen according to balanced optimal mixed strategy)."
     return gt_winner
 
-def gtd_winner(A,P,params,election_ID,printing_wanted=False):
+def gtd_winner(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return winner according to GTD voting system (deterministic version of GT).
     Returns candidate with largest probability in optimal mixed strategy.
@@ -1209,7 +2175,7 @@ def gtd_winner(A,P,params,election_ID,printing_wanted=False):
         print indent+"GTD winner is",gtd_winner, " (a candidate with max probability in optimal mixed strategy)."
     return gtd_winner
 
-def gts_winners(A,P,params,election_ID,printing_wanted=False):
+def gts_winners(A,P,params,election_ID,printing_wanted=False,rng=None):
     """
     Return set of support for GT voting system.
     """                                      
@@ -1290,6 +2256,7 @@ def test_P(P,params,election_ID):
     Borda_winner(A,P,params,election_ID,printing_wanted=True)
     minimax_winner(A,P,params,election_ID,printing_wanted=True)
     Smith = Smith_set(A,P,params,election_ID,printing_wanted=True)
+    Uncovered_set(A,P,params,election_ID,printing_wanted=True)
     IRV_winner(A,P,params,election_ID,printing_wanted=True)
     beatpath_winner(A,P,params,election_ID,printing_wanted=True)
     gt_winner(A,P,params,election_ID,printing_wanted=True)
@@ -1304,12 +2271,13 @@ def test_P(P,params,election_ID):
         print_pairwise_prefs(Smith,prefSmith,election_ID)
         # more to add here...
 
-def runoff(fname,f,gname,g,printing_wanted=True):
+def runoff(fname,f,gname,g,printing_wanted=True,root_seed=0):
     """
     Compare method f to method g.
     Here fname and gname are strings giving the names of the two methods.
          f and g take args A,P,params and return a winner.
     Profile is generated randomly, subject to not having Condorcet winner.
+    Trial t uses the random number streams rng_stream(root_seed,t,...).
     """ 
     election_ID = "runoff"
     number_condorcet = 0
@@ -1332,23 +2300,23 @@ def runoff(fname,f,gname,g,printing_wanted=True):
     N_xy = 0
     N_yx = 0
     for trial in range(trials):
-        trial_counter = 0
+        profile_rng = rng_stream(root_seed,trial,"profile")
         while True:                   # look for profile with generalized tie
-            seed = trial*100000 + trial_counter
             P = random_profile(A,ballot_count,
                                ballot_distribution,
                                ballot_lengths,
-                               seed
+                               profile_rng
                                )
             if condorcet_OK or len(Smith_set(A,P,params,election_ID)) > 1:
                 break
-            trial_counter += 1
         if Condorcet_winner(A,P,params,election_ID,printing_wanted=False) != None:
             number_condorcet += 1
         prefs = pairwise_prefs(A,P,params)
         print_profile(P,election_ID)
-        x = g(A,P,params,election_ID,printing_wanted=True)         # typically GT
-        y = f(A,P,params,election_ID,printing_wanted=True)         # other method
+        x = g(A,P,params,election_ID,printing_wanted=True,         # typically GT
+              rng=rng_stream(root_seed,trial,"lottery",gname))
+        y = f(A,P,params,election_ID,printing_wanted=True,         # other method
+              rng=rng_stream(root_seed,trial,"lottery",fname))
         N_xy += prefs[(x,y)]
         N_yx += prefs[(y,x)]
         print "Trial %4d: Total number preferring %s over %s = %6d," \
@@ -1376,34 +2344,63 @@ def agree(x,y):
         if yj in xset: return True
     return False
 
-def compare_methods(qs, printing_wanted=True):
+def compare_methods(qs, printing_wanted=True, root_seed=0, executor="serial", workers=None):
     """
     Compare methods in qs to each other (and to GT and GTD).
     qs contains a list of (qname, q) pairs, where qname is a string giving
     the name of the method, and q takes args A,P, params and returns a winner.
     Profiles are generated randomly, and may have a Condorcet winner.
     (Currently we do not filter out those profiles having a Condorcet winner.)
-    """
-    election_ID = "compare"
-    m = 5                            # number of candidates
-    trials = 10000                   # number of simulated elections
-    ballot_count = 100               # ballots per simulated election
-    ballot_distribution = ("hypersphere",3)   # points on a sphere
-    ballot_lengths = None            # full ballots wanted
-    params = None                    # no special ballot treatments
-    condorcet_OK = True              # proceed even if there is a Condorcet winner
 
+    Each trial is run by compare_trial, using only random number streams
+    derived from root_seed and the trial number (see rng_stream).  So the
+    results are the same, bit for bit, whether the trials are run serially
+    (executor="serial"), in a pool of threads (executor="threads"), or in a
+    pool of processes (executor="processes"); workers gives the pool size
+    (default: number of CPUs).  Per-trial printing is only done when serial.
+    At the end, histograms of the CVXOPT solves made (game_cvxopt.solve_log)
+    are printed, except with processes.
+    """
+    config = { }
+    config["m"] = 5                  # number of candidates
+    config["trials"] = 10000         # number of simulated elections
+    config["ballot_count"] = 100     # ballots per simulated election
+    config["ballot_distribution"] = ("hypersphere",3)   # points on a sphere
+    config["ballot_lengths"] = None  # full ballots wanted
+    config["params"] = None          # no special ballot treatments
+    config["condorcet_OK"] = True    # proceed even if there is a Condorcet winner
+
+    m = config["m"]
+    trials = config["trials"]
     A = list(string.uppercase[:m])   # candidates are 'A' 'B' 'C' ...
     setup_TB(A)                      # establish tie-breaker values
-    num_methods = len(qs)
 
     if printing_wanted:
         print "Number of candidates =",m
-        print "Number of ballots per election trial =",ballot_count
-        print "ballot_distribution:",ballot_distribution
-        print "ballot min/max lengths:",ballot_lengths
-        print "Allow profiles with Condorcet winners:",condorcet_OK
+        print "Number of ballots per election trial =",config["ballot_count"]
+        print "ballot_distribution:",config["ballot_distribution"]
+        print "ballot min/max lengths:",config["ballot_lengths"]
+        print "Allow profiles with Condorcet winners:",config["condorcet_OK"]
+        print "Root seed:",root_seed,"  executor:",executor
+
+    game_cvxopt.solve_log.clear()
+    trial_printing_wanted = printing_wanted and executor == "serial"
+    jobs = [ (trial,root_seed,A,qs,config,trial_printing_wanted) for trial in range(trials) ]
+    if executor == "serial":
+        results = map(compare_trial,jobs)
+    elif executor == "threads":
+        pool = multiprocessing.pool.ThreadPool(workers)
+        results = pool.map(compare_trial,jobs)
+        pool.close()
+    elif executor == "processes":
+        pool = multiprocessing.Pool(workers,setup_worker_TB,(TB,))
+        results = pool.map(compare_trial,jobs)
+        pool.close()
+    else:
+        print "Illegal executor for compare_methods:",executor
+        sys.exit()
 
+    # results come back in trial order, so totals do not depend on the executor
     trial_counter = 0
     number_condorcet = 0
     num_optimal_mixed_strategy_unique = 0
@@ -1415,57 +2412,22 @@ def compare_methods(qs, printing_wanted=True):
             Nagree[qiname,qjname] = 0
             Nprefs[qiname,qjname] = 0
             Nmargins[qiname,qjname] = 0
-    for trial in range(trials):
-        print "Trial %4d:"%trial
-        # generate random profile
-        while True:
-            trial_counter += 1
-            seed = trial_counter
-            P = random_profile(A,ballot_count,
-                               ballot_distribution,
-                               ballot_lengths,
-                               seed
-                               )
-            has_condorcet = (Condorcet_winner(A,P,params,election_ID,
-                                               printing_wanted=False) != None)
-            if condorcet_OK or not has_condorcet:
-                break
-        if printing_wanted:
-            print_profile(P,election_ID)
-        if has_condorcet:
+    for result in results:
+        trial_counter += result["profiles_generated"]
+        if result["has_condorcet"]:
             number_condorcet += 1
-        prefs = pairwise_prefs(A,P,params)
-        margins = pairwise_margins(A,P,params)
-        # Generate optimal mixed strategy, GT winner, GTD winner
-        lp_p = gt_optimal_mixed_strategy_lp(A,P,params,election_ID,printing_wanted)
-        p = gt_optimal_mixed_strategy(A,P,params,election_ID,printing_wanted)
-        if L1_dist(lp_p,p) < 0.02:
+        if result["gt_unique"]:
             num_optimal_mixed_strategy_unique += 1
-            if printing_wanted:
-                print indent+"LP and QP give same solution to GT"
-        else:
-            if printing_wanted:
-                print indent+"LP and QP give different solutions to GT"
-        # iterate through all methods
-        w = [ None ] * len(qs)     # for each method, a winner, or a list of winners
-        for (i,(qname, q)) in enumerate(qs):
-            w[i] = q(A,P,params,election_ID,printing_wanted=True)
-        # score each method relative to the other
-        for (i,(qiname, qi)) in enumerate(qs):
-            for (j,(qjname, qj)) in enumerate(qs):
-                # agreement
-                if agree(w[i],w[j]):
-                    Nagree[qiname,qjname] += 1
-                # preferences and margins
-                if type(w[i])==type(str()) and type(w[j])==type(str()):
-                    Nprefs[qiname,qjname]+=prefs[w[i],w[j]]
-                    Nmargins[qiname,qjname]+=margins[w[i],w[j]]
+        for key in result["Nagree"]:
+            Nagree[key] += result["Nagree"][key]
+            Nprefs[key] += result["Nprefs"][key]
+            Nmargins[key] += result["Nmargins"][key]
 
     print "--------------------------------------------------------------------------------------"
     print "\nnumber of trials = ",trials
     print "number of profiles generated = ", trial_counter
     print "number having Condorcet winner = ", number_condorcet
-    print "number of times LP and QP gave same solution to GT = ", num_optimal_mixed_strategy_unique
+    print "number of times GT optimal mixed strategy was unique = ", num_optimal_mixed_strategy_unique
     method_names = [ qname for (qname,q) in qs ]
     print "Nagree:"
     print_matrix(method_names,Nagree)
@@ -1473,6 +2435,86 @@ def compare_methods(qs, printing_wanted=True):
     print_matrix(method_names,Nprefs)
     print "Nmargins:"
     print_matrix(method_names,Nmargins)
+    if executor == "processes":
+        print "(GT solution cache statistics and the solver log are kept separately by each worker process.)"
+    else:
+        print_gt_cache_stats()
+        for line in game_cvxopt.solve_log.summary_lines():
+            print line
+
+def compare_trial(job):
+    """
+    Run one trial of compare_methods.
+    Here job is a tuple (trial,root_seed,A,qs,config,printing_wanted).
+    The profile is drawn from rng_stream(root_seed,trial,"profile"), and method qname
+    gets rng_stream(root_seed,trial,"lottery",qname) for any lottery it needs.
+    Return a dict giving this trial's contributions to the totals in compare_methods.
+    """
+    (trial,root_seed,A,qs,config,printing_wanted) = job
+    election_ID = "compare"
+    params = config["params"]
+    if printing_wanted:
+        print "Trial %4d:"%trial
+    result = { }
+    # generate random profile
+    profile_rng = rng_stream(root_seed,trial,"profile")
+    result["profiles_generated"] = 0
+    while True:
+        result["profiles_generated"] += 1
+        P = random_profile(A,config["ballot_count"],
+                           config["ballot_distribution"],
+                           config["ballot_lengths"],
+                           profile_rng
+                           )
+        has_condorcet = (Condorcet_winner(A,P,params,election_ID,
+                                          printing_wanted=False) != None)
+        if config["condorcet_OK"] or not has_condorcet:
+            break
+    if printing_wanted:
+        print_profile(P,election_ID)
+    result["has_condorcet"] = has_condorcet
+    prefs = pairwise_prefs(A,P,params)
+    margins = pairwise_margins(A,P,params)
+    # Generate optimal mixed strategy, and certify it (and whether it is unique)
+    p = gt_optimal_mixed_strategy(A,P,params,election_ID,printing_wanted)
+    (optimal,unique) = game_cvxopt.certify_strategy(margin_matrix(A,margins),p)
+    if not optimal:
+        print "Warning: GT solution for trial %d is not certified optimal."%trial
+    result["gt_unique"] = (unique == True)
+    if printing_wanted:
+        if result["gt_unique"]:
+            print indent+"Optimal mixed strategy for GT is certified unique"
+        else:
+            print indent+"Optimal mixed strategy for GT is not unique"
+    # iterate through all methods
+    w = [ None ] * len(qs)     # for each method, a winner, or a list of winners
+    for (i,(qname, q)) in enumerate(qs):
+        w[i] = q(A,P,params,election_ID,printing_wanted=printing_wanted,
+                 rng=rng_stream(root_seed,trial,"lottery",qname))
+    # score each method relative to the other
+    Nagree = result["Nagree"] = { }
+    Nprefs = result["Nprefs"] = { }
+    Nmargins = result["Nmargins"] = { }
+    for (i,(qiname, qi)) in enumerate(qs):
+        for (j,(qjname, qj)) in enumerate(qs):
+            Nagree[qiname,qjname] = 0
+            Nprefs[qiname,qjname] = 0
+            Nmargins[qiname,qjname] = 0
+            # agreement
+            if agree(w[i],w[j]):
+                Nagree[qiname,qjname] += 1
+            # preferences and margins
+            if type(w[i])==type(str()) and type(w[j])==type(str()):
+                Nprefs[qiname,qjname]+=prefs[w[i],w[j]]
+                Nmargins[qiname,qjname]+=margins[w[i],w[j]]
+    return result
+
+def setup_worker_TB(tb):
+    """
+    Initialize a worker process of compare_methods with the parent's tie-breaker values.
+    """
+    global TB
+    TB = tb
 
         
 if __name__ == "__main__":